@@ -0,0 +1,246 @@
+"""
+On-disk archive of positions reached in recorded games.
+
+Positions are kept in an SQLite database, one row per position of each
+game, indexed by canonical hash (see book.canonical_hash, so that
+symmetric positions share a hash), and by number of players, number of
+empty squares and player to move. Boards are stored as they were played,
+one byte per square, so queries can also put conditions on squares.
+
+Games come from the results of tournament.run_tournament (which record
+the moves of every game), or are added one by one.
+"""
+import json
+import sqlite3
+from typing import (Any, Dict, Iterable, Iterator, List, NamedTuple,
+                    Optional, Sequence, Tuple, Union)
+
+from reversi import GameState, Reversi, play
+from book import canonical_hash
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    hash INTEGER NOT NULL,
+    side INTEGER NOT NULL,
+    players INTEGER NOT NULL,
+    othello INTEGER NOT NULL,
+    empties INTEGER NOT NULL,
+    turn INTEGER NOT NULL,
+    num_moves INTEGER NOT NULL,
+    board BLOB NOT NULL,
+    game INTEGER NOT NULL,
+    ply INTEGER NOT NULL,
+    move INTEGER,
+    winners INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS positions_hash ON positions (hash);
+CREATE INDEX IF NOT EXISTS positions_shape
+    ON positions (players, empties, turn);
+CREATE INDEX IF NOT EXISTS positions_game ON positions (game);
+"""
+
+
+class ArchivedPosition(NamedTuple):
+    """
+    Position found in the archive.
+
+    Attributes:
+        state: the game state
+        game: the number of the game it was reached in
+        ply: the number of moves played before it in that game
+        move: the move played from it (None at the end of the game)
+        winners: the winners of the game
+    """
+    state: GameState
+    game: int
+    ply: int
+    move: Optional[Tuple[int, int]]
+    winners: List[int]
+
+
+def _signed(key: int) -> int:
+    """
+    Maps an unsigned 64-bit hash to the signed integers SQLite stores
+    """
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+class Archive:
+    """
+    Position archive stored in an SQLite file
+    """
+
+    def __init__(self, path: str):
+        """
+        Constructor
+
+        Args:
+            path: the database file (created if needed; ":memory:" for
+                an archive that is not saved)
+        """
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+    def _next_game(self) -> int:
+        """
+        Returns a game number not used yet (read from the index on game,
+        so that it does not get slower as the archive grows)
+        """
+        last = self.db.execute("SELECT MAX(game) FROM positions").fetchone()
+        return 0 if last[0] is None else last[0] + 1
+
+    def add_game(self, side: int, players: int, othello: bool,
+                 moves: Sequence[Sequence[int]], winners: Sequence[int],
+                 game: Optional[int] = None) -> int:
+        """
+        Adds every position of a game, including the final one
+
+        Args:
+            side: board size
+            players: number of players
+            othello: whether the game started with an Othello
+                configuration
+            moves: the moves of the game
+            winners: the winners of the game
+            game: the number of the game (the next unused one if None)
+
+        Returns: the number of the game
+        """
+        if game is None:
+            game = self._next_game()
+        mask = sum(1 << (player - 1) for player in winners)
+        state = GameState.from_reversi(Reversi(side, players, othello))
+        rows = []
+        for ply in range(len(moves) + 1):
+            move = None
+            if ply < len(moves):
+                move = moves[ply][0] * side + moves[ply][1]
+            rows.append((_signed(canonical_hash(state)[0]), side, players,
+                         othello, state.empties, state.turn,
+                         state.num_moves, bytes(state.board), game, ply,
+                         move, mask))
+            if move is not None:
+                state = play(state, tuple(moves[ply]))
+        with self.db:
+            self.db.executemany("INSERT INTO positions VALUES "
+                                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return game
+
+    def add_results(self, lines: Iterable[Union[str, Dict[str, Any]]]
+                    ) -> int:
+        """
+        Adds the games of tournament results
+
+        Args:
+            lines: JSON lines (or already decoded results) as written by
+                tournament.run_tournament
+
+        Returns: the number of games added
+        """
+        count = 0
+        for line in lines:
+            if isinstance(line, str):
+                if not line.strip():
+                    continue
+                line = json.loads(line)
+            self.add_game(line["side"], line["players"], line["othello"],
+                          line["moves"], line["winners"])
+            count += 1
+        return count
+
+    def find(self, game: Union[Reversi, GameState]) -> List[ArchivedPosition]:
+        """
+        Finds the occurrences of a position, or of any of its rotations
+        and reflections
+
+        Args:
+            game: the game (or game state)
+
+        Returns: the archived positions with the same canonical hash
+        """
+        state = game
+        if isinstance(game, Reversi):
+            state = GameState.from_reversi(game)
+        return list(self.query(key=canonical_hash(state)[0]))
+
+    def query(self, empties: Optional[int] = None,
+              players: Optional[int] = None, turn: Optional[int] = None,
+              side: Optional[int] = None, key: Optional[int] = None,
+              squares: Optional[Dict[Tuple[int, int], int]] = None,
+              limit: Optional[int] = None) -> Iterator[ArchivedPosition]:
+        """
+        Finds the positions that meet every given condition
+
+        Args:
+            empties: number of empty squares
+            players: number of players
+            turn: player to move
+            side: board size
+            key: canonical hash
+            squares: owner (0 for empty) of some squares, by position.
+                Conditions on squares need side to be given.
+            limit: the largest number of positions to return
+
+        Raises:
+            ValueError: If squares is given without side
+
+        Returns: an iterator over the positions, in the order they were
+            added
+        """
+        where = []
+        args: List[Any] = []
+        for column, value in (("empties", empties), ("players", players),
+                              ("turn", turn), ("side", side)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                args.append(value)
+        if key is not None:
+            where.append("hash = ?")
+            args.append(_signed(key))
+        if squares:
+            if side is None:
+                raise ValueError("conditions on squares need a board size")
+            for (row, col), owner in squares.items():
+                where.append("substr(board, ?, 1) = ?")
+                args.extend([row * side + col + 1, bytes([owner])])
+        sql = ("SELECT side, players, othello, board, turn, num_moves, game, "
+               "ply, move, winners FROM positions")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY rowid"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return self._positions(self.db.execute(sql, args))
+
+    def _positions(self, rows: Iterable[Tuple]) -> Iterator[ArchivedPosition]:
+        """
+        Decodes the rows of a query
+        """
+        for (side, players, othello, board, turn, num_moves, game, ply,
+             move, mask) in rows:
+            board = tuple(board)
+            counters = tuple(board.count(p) for p in range(1, players + 1))
+            state = GameState(side, players, bool(othello), board, turn,
+                              num_moves, counters)
+            yield ArchivedPosition(
+                state, game, ply,
+                None if move is None else divmod(move, side),
+                [p for p in range(1, players + 1) if mask >> (p - 1) & 1])
+
+    def close(self) -> None:
+        """
+        Closes the database
+
+        Returns: None
+        """
+        self.db.close()
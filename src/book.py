@@ -0,0 +1,274 @@
+"""
+Opening book for Reversi.
+
+A book file is a header followed by fixed-size records of (canonical
+position hash, best move, score), sorted by hash. OpeningBook maps the
+file into memory and binary-searches it, so there is no load step, and
+all the processes that open the same book share one copy of it in the
+page cache.
+
+Positions are looked up by a canonical hash: the smallest hash among
+the eight rotations and reflections of the board, so that symmetric
+positions share one record. Moves are stored for the canonical
+orientation, and turned back on lookup.
+"""
+import functools
+import hashlib
+import mmap
+import struct
+from typing import Dict, List, Optional, Tuple, Union
+
+from reversi import Reversi, GameState, legal_moves, play
+
+MAGIC = b"RVBK"
+HEADER = struct.Struct("<4sII")
+"""
+Book file header: magic, format version and number of records.
+"""
+RECORD = struct.Struct("<QHh")
+"""
+Book record: canonical position hash, packed index of the best move in
+the canonical orientation and score.
+"""
+VERSION = 1
+
+
+@functools.lru_cache(maxsize=None)
+def symmetries(side: int) -> Tuple[Tuple[int, ...], ...]:
+    """
+    Computes the eight rotations and reflections of a packed board
+
+    Args:
+        side: number of squares on each side of the board
+
+    Returns: eight permutations, the first one being the identity. The
+        square idx of a transformed board holds the square perm[idx] of
+        the original one.
+    """
+    last = side - 1
+    transforms = [lambda r, c: (r, c), lambda r, c: (c, last - r),
+                  lambda r, c: (last - r, last - c),
+                  lambda r, c: (last - c, r), lambda r, c: (r, last - c),
+                  lambda r, c: (last - r, c), lambda r, c: (c, r),
+                  lambda r, c: (last - c, last - r)]
+    perms = []
+    for transform in transforms:
+        perm = [0] * (side * side)
+        for r in range(side):
+            for c in range(side):
+                tr, tc = transform(r, c)
+                perm[tr * side + tc] = r * side + c
+        perms.append(tuple(perm))
+    return tuple(perms)
+
+
+def position_hash(state: GameState, board: Tuple[int, ...]) -> int:
+    """
+    Hashes a board together with the parts of a state that decide which
+    moves are legal
+
+    Args:
+        state: the game state
+        board: the (possibly transformed) board of the state
+
+    Returns: a 64-bit hash
+    """
+    opening = state.num_moves < state.players ** 2 and not state.othello
+    prefix = bytes([state.side, state.players, state.turn, opening])
+    digest = hashlib.blake2b(prefix + bytes(board), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def canonical_hash(state: GameState) -> Tuple[int, int]:
+    """
+    Finds the canonical hash of a position
+
+    Args:
+        state: the game state
+
+    Returns: the smallest hash over the symmetries of the board, and the
+        index of the symmetry that gives it
+    """
+    best = None
+    for i, perm in enumerate(symmetries(state.side)):
+        board = tuple(state.board[idx] for idx in perm)
+        key = (position_hash(state, board), i)
+        if best is None or key < best:
+            best = key
+    return best
+
+
+def _to_canonical(move: Tuple[int, int], side: int, symmetry: int) -> int:
+    """
+    Returns the packed index of a move in the canonical orientation
+    """
+    return symmetries(side)[symmetry].index(move[0] * side + move[1])
+
+
+def _from_canonical(idx: int, side: int, symmetry: int) -> Tuple[int, int]:
+    """
+    Returns the position of a canonical packed index in the original
+    orientation
+    """
+    return divmod(symmetries(side)[symmetry][idx], side)
+
+
+def _as_state(game: Union[Reversi, GameState]) -> GameState:
+    """
+    Returns the GameState of a game, or the state itself
+    """
+    if isinstance(game, Reversi):
+        return GameState.from_reversi(game)
+    return game
+
+
+class BookBuilder:
+    """
+    Collects positions and their best moves, and writes them to a book
+    file
+    """
+
+    def __init__(self) -> None:
+        self.entries: Dict[int, Tuple[int, int]] = {}
+
+    def add(self, game: Union[Reversi, GameState], move: Tuple[int, int],
+            score: float) -> None:
+        """
+        Adds (or replaces) the best move of a position
+
+        Args:
+            game: the game (or game state)
+            move: the best move
+            score: the score of the move for the player to move
+
+        Returns: None
+        """
+        state = _as_state(game)
+        key, symmetry = canonical_hash(state)
+        score = max(-32768, min(32767, round(score)))
+        self.entries[key] = (_to_canonical(move, state.side, symmetry), score)
+
+    def write(self, path: str) -> None:
+        """
+        Writes the book, sorted by hash
+
+        Args:
+            path: the file to write
+
+        Returns: None
+        """
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(self.entries)))
+            for key in sorted(self.entries):
+                f.write(RECORD.pack(key, *self.entries[key]))
+
+
+class OpeningBook:
+    """
+    Read-only, memory-mapped opening book
+    """
+
+    def __init__(self, path: str):
+        """
+        Constructor
+
+        Args:
+            path: the book file
+
+        Raises:
+            ValueError: If the file is not a book
+        """
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not an opening book")
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self) -> "OpeningBook":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _record(self, i: int) -> Tuple[int, int, int]:
+        """
+        Reads the i-th record
+        """
+        return RECORD.unpack_from(self._map, HEADER.size + i * RECORD.size)
+
+    def lookup(self, game: Union[Reversi, GameState]
+               ) -> Optional[Tuple[Tuple[int, int], int]]:
+        """
+        Looks up a position
+
+        Args:
+            game: the game (or game state)
+
+        Returns: the best move and its score, or None if the position is
+            not in the book
+        """
+        state = _as_state(game)
+        key, symmetry = canonical_hash(state)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count:
+            return None
+        found, idx, score = self._record(lo)
+        if found != key:
+            return None
+        move = _from_canonical(idx, state.side, symmetry)
+        if move not in legal_moves(state):
+            return None
+        return move, score
+
+    def close(self) -> None:
+        """
+        Unmaps the book
+
+        Returns: None
+        """
+        self._map.close()
+
+
+def build_book(path: str, game: Union[Reversi, GameState], plies: int,
+               searcher) -> int:
+    """
+    Writes a book with the best move of every position reachable in at
+    most a given number of moves
+
+    Args:
+        path: the file to write
+        game: the starting game (or game state)
+        plies: number of moves to explore from the start
+        searcher: an object with a search method returning a result with
+            move and score attributes (like search.Searcher)
+
+    Returns: the number of positions in the book
+    """
+    builder = BookBuilder()
+    seen = set()
+    frontier: List[GameState] = [_as_state(game)]
+    for _ in range(plies):
+        following = []
+        for state in frontier:
+            key = canonical_hash(state)[0]
+            moves = legal_moves(state)
+            if key in seen or not moves:
+                continue
+            seen.add(key)
+            result = searcher.search(state)
+            builder.add(state, result.move, result.score)
+            following.extend(play(state, move) for move in moves)
+        frontier = following
+    builder.write(path)
+    return len(builder.entries)
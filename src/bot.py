@@ -1,129 +1,259 @@
 from mocks import ReversiBotMock
-from reversi import Reversi
+from reversi import Reversi, GameState
+from search import Searcher
+from endgame import EndgameSolver
+from evaluation import evaluate, rewards_batch
+from book import OpeningBook
+from mcts import MCTS, best_move, parallel_search
+from tournament import run_tournament, run_match, SPRT
 import random
-import math
-import click
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Optional
+from typing import Tuple, Optional
 import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
 
 game: ReversiBotMock
 player: int
 
+DEADLINE_MARGIN_MS = 20
 
-class RandomBot():
-    
-    def __init__(self, game: ReversiBotMock, player: int):
-        
-        self.game = game
-        self.player = player
-        self.moves = []
 
-    def random_move(self) -> Tuple[int, int]:
-        
-        random_move = random.choice(self.game.available_moves)
-        self.game.apply_move(random_move)
-        self.moves.append(random_move)
+class Bot(ABC):
+    """
+    Base class for bots.
 
-        return random_move
+    choose_move(game, deadline_ms) returns the move the bot wants to play
+    for the player to move, without applying it. When deadline_ms is
+    given, the bot returns the best move it has found so far once that
+    many milliseconds have passed. play_move also applies the move.
+    Bots that search look the position up in their opening book (if
+    they have one) first. All the randomness of a bot comes from its
+    rng, so a game between seeded bots can be replayed.
 
-class SmartBot():
-    def __init__(self, game: ReversiBotMock, player: int):
-        self.game = game
+    ponder(game) lets a bot keep searching in a background thread while
+    the opponents think (for example while a human picks a move in the
+    GUI or TUI). The next call to choose_move stops it, and reuses what
+    it found. Bots that do not search ignore it.
+    """
+
+    def __init__(self, player: int, book: Optional[OpeningBook] = None,
+                 rng: Optional[random.Random] = None):
         self.player = player
         self.moves = []
+        self.book = book
+        self.rng = rng if rng is not None else random.Random()
+        self._ponder_thread: Optional[threading.Thread] = None
+        self._ponder_stop = threading.Event()
+
+    @abstractmethod
+    def choose_move(self, game: Reversi,
+                    deadline_ms: Optional[int] = None) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def play_move(self, game: Reversi,
+                  deadline_ms: Optional[int] = None) -> Tuple[int, int]:
+        move = self.choose_move(game, deadline_ms)
+        game.apply_move(move)
+        self.moves.append(move)
+
+        return move
+
+    def book_move(self, game: Reversi) -> Optional[Tuple[int, int]]:
+        if self.book is None:
+            return None
+        found = self.book.lookup(game)
+        if found is None:
+            return None
+        return found[0]
+
+    def ponder(self, game: Reversi) -> None:
+        self.stop_pondering()
+        self._ponder_stop = threading.Event()
+        self._ponder_thread = threading.Thread(
+            target=self._ponder,
+            args=(GameState.from_reversi(game), self._ponder_stop),
+            daemon=True)
+        self._ponder_thread.start()
+
+    def _ponder(self, state: GameState, stop: threading.Event) -> None:
+        pass
+
+    def stop_pondering(self) -> None:
+        if self._ponder_thread is not None:
+            self._ponder_stop.set()
+            self._ponder_thread.join()
+            self._ponder_thread = None
+
+    def close(self) -> None:
+        self.stop_pondering()
+
+
+def time_budget(deadline_ms: Optional[int],
+                default: Optional[float] = None) -> Optional[float]:
+    if deadline_ms is None:
+        return default
+    return max(deadline_ms - DEADLINE_MARGIN_MS, 1) / 1000
+
+
+class RandomBot(Bot):
+
+    def choose_move(self, game: Reversi,
+                    deadline_ms: Optional[int] = None) -> Tuple[int, int]:
 
-    def get_num_pieces(self) -> int:
-        num_pieces = 0
-        for r in range(self.game.side):
-            for c in range(self.game.side):
-                if self.game.othello[r][c] == self.player:
-                    num_pieces += 1
-        return num_pieces
+        return self.rng.choice(game.available_moves)
 
-    def choose_move(self) -> Tuple[int, int]:
+class SmartBot(Bot):
+
+    def choose_move(self, game: Reversi,
+                    deadline_ms: Optional[int] = None) -> Tuple[int, int]:
         best_move = None
-        best_num_pieces = -1
+        best_flips = -1
 
-        for move in self.game.available_moves:
-            sim_game = self.game.simulate_moves([move])
-            num_pieces = sim_game.bot1.get_num_pieces() if self.player == 1 else sim_game.bot2.get_num_pieces()
-            if num_pieces > best_num_pieces:
-                best_num_pieces = num_pieces
+        for move, flips in game.move_flips().items():
+            if flips > best_flips:
+                best_flips = flips
                 best_move = move
 
-        self.game.apply_move(best_move)
-        self.moves.append(best_move)
-
         return best_move
 
-def SnmarterBot(basegame: Reversi, turn: int) -> None:
-    '''
-    outcomes = basegame.available_moves
-    high = -math.inf
-    optimal = []
-    for move in outcomes:
-        total = 0
-        first = basegame.simulate_moves([move])
-        if first.done:
-            optimal = [move]
-            break
-        second = first.available_moves
-        if second:
-            for move_two in second:
-                final = first.simulate_moves([move_two                            total += 1
-            if total / len(second) > high:
-                high = total / len(second)
-                optimal = []
-                optimal.append(move)
-            elif total / len(second) == high:
-                optimal.append(move)
-    if optimal:
-        pick = random.randint(0,len(optimal) - 1)
-        basegame.apply_move(optimal[pick])
-
-@click.command("bot")
-
-
-def play_games(num_games):
-
-    bot1_wins = 0
-    bot2_wins = 0
-
-
-    for i in range(num_games):
-        match = ReversiBotMock(8, 2, False)
-        bot1 = RandomBot(match, 1)
-        bot2 = SmarterBot(match, 2)
-        while not match.outcome():
-
-            bot1.random_move()
-
-            if match.outcome() != 0:
-                break
-            
-            bot2.choose_move()
-
-
-        
-        outcome = match.outcome
-
-        if outcome == [1]:
-            bot1_wins += 1
-        elif outcome  == [2]:
-            bot2_wins += 1
-
-    bot1_percent = (bot1_wins / num_games) * 100
-    bot2_percent = (bot2_wins / num_games) * 100
-    ties_percent = 100 - bot1_percent - bot2_percent
-
-    print("Player 1 wins: {:.2f}%".format(bot1_percent))
-    print("Player 2 wins: {:.2f}%".format(bot2_percent))
-    print("Ties: {:.2f}%".format(ties_percent))
+class SearchBot(Bot):
+    def __init__(self, player: int, depth: int = 4,
+                 time_limit: Optional[float] = None,
+                 endgame_empties: int = 10,
+                 book: Optional[OpeningBook] = None,
+                 rng: Optional[random.Random] = None):
+        super().__init__(player, book, rng)
+        self.time_limit = time_limit
+        self.searcher = Searcher(evaluate, max_depth=depth,
+                                 time_limit=time_limit,
+                                 endgame=EndgameSolver(endgame_empties))
+
+    def choose_move(self, game: Reversi,
+                    deadline_ms: Optional[int] = None) -> Tuple[int, int]:
+        self.stop_pondering()
+        move = self.book_move(game)
+        if move is not None:
+            return move
+        self.searcher.time_limit = time_budget(deadline_ms, self.time_limit)
+
+        return self.searcher.search(game).move
+
+    def _ponder(self, state: GameState, stop: threading.Event) -> None:
+        searcher = self.searcher
+        depth = searcher.max_depth
+        searcher.time_limit = None
+        searcher.max_depth = depth + 1
+        try:
+            searcher.search(state, stop)
+        finally:
+            searcher.max_depth = depth
+
+class MCTSBot(Bot):
+    def __init__(self, player: int, time_limit: float = 1.0,
+                 workers: int = 1, seed: Optional[int] = None,
+                 book: Optional[OpeningBook] = None,
+                 rng: Optional[random.Random] = None,
+                 batch_size: Optional[int] = None):
+        if rng is None:
+            rng = random.Random(seed)
+        super().__init__(player, book, rng)
+        self.time_limit = time_limit
+        self.workers = workers
+        if batch_size is None:
+            self.mcts = MCTS(rng=self.rng)
+        else:
+            self.mcts = MCTS(rng=self.rng, evaluator=rewards_batch,
+                             batch_size=batch_size)
+        self.executor = None
+        if workers > 1:
+            self.executor = ProcessPoolExecutor(workers)
+
+    def choose_move(self, game: Reversi,
+                    deadline_ms: Optional[int] = None) -> Tuple[int, int]:
+        self.stop_pondering()
+        move = self.book_move(game)
+        if move is not None:
+            return move
+        state = GameState.from_reversi(game)
+        time_limit = time_budget(deadline_ms, self.time_limit)
+        if self.executor is None:
+            counts = self.mcts.search(state, time_limit, reuse=True)
+        else:
+            counts = parallel_search(self.executor, state, self.workers,
+                                     time_limit,
+                                     seed=self.rng.getrandbits(32))
+
+        return best_move(counts)
+
+    def _ponder(self, state: GameState, stop: threading.Event) -> None:
+        if self.executor is None:
+            self.mcts.search(state, reuse=True, stop=stop)
+
+    def close(self) -> None:
+        super().close()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+BOTS = {"random": RandomBot, "smart": SmartBot, "search": SearchBot,
+        "mcts": MCTSBot}
+
+
+def play_games(num_games: int, bots=(RandomBot, SmartBot), side: int = 8,
+               players: int = 2, othello: bool = False,
+               workers: Optional[int] = None, out=None,
+               seed: Optional[int] = None,
+               sprt: Optional[SPRT] = None, log=sys.stderr) -> None:
+
+    if sprt is None:
+        standings = run_tournament(list(bots), num_games, side, players,
+                                   othello, workers=workers, out=out,
+                                   log=log, seed=seed)
+    else:
+        first, second = bots
+        match = run_match(first, second, sprt, num_games, side=side,
+                          players=players, othello=othello, workers=workers,
+                          out=out, log=log, seed=seed)
+        standings = match.standings
+        print("SPRT after {} games: {} (LLR {:.2f})"
+              .format(standings.games, match.decision or "undecided",
+                      match.llr))
+
+    for bot, name in enumerate(standings.names):
+        rate, half = standings.score(bot)
+        played = max(standings.wins[bot] + standings.draws[bot]
+                     + standings.losses[bot], 1)
+        print("{} wins: {:.2f}%, ties: {:.2f}%, score: {:.2f}% ± {:.2f}%"
+              .format(name, 100 * standings.wins[bot] / played,
+                      100 * standings.draws[bot] / played, 100 * rate,
+                      100 * half))
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python3 src/bot.py NUM_GAMES")
+    args = sys.argv[1:]
+    out_path = None
+    if "-o" in args:
+        i = args.index("-o")
+        out_path = args[i + 1] if i + 1 < len(args) else None
+        del args[i:i + 2]
+        if out_path is None:
+            args = []
+    if not args:
+        print("Usage: python3 src/bot.py NUM_GAMES [BOT BOT ...] [SEED] "
+              "[-o RESULTS_FILE]")
+        print("Bots: " + ", ".join(BOTS))
+        print("Rolling standings go to stderr; -o writes one JSON line "
+              "per game to RESULTS_FILE.")
         sys.exit(1)
-    num_games = int(sys.argv[1])
-    play_games(num_games)
+    num_games = int(args[0])
+    names = args[1:] or ["random", "smart"]
+    seed = None
+    if names[-1].isdigit():
+        seed = int(names.pop())
+    names = names or ["random", "smart"]
+    bots = [BOTS[name] for name in names]
+    if out_path is None:
+        play_games(num_games, bots, seed=seed)
+    else:
+        with open(out_path, "w") as results:
+            play_games(num_games, bots, out=results, seed=seed)
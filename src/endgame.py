@@ -0,0 +1,267 @@
+"""
+Exact endgame solver for two-player Reversi.
+
+Once few enough squares are empty, the rest of the game can be searched
+to the end. The solver plays moves on a private packed board with
+make/unmake, and orders moves by parity (moves in regions of the board
+with an odd number of empty squares first) and fastest-first (moves
+that leave the opponent with the fewest replies first).
+"""
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from reversi import Reversi, GameState, rays_table, flipped_by
+
+
+class EndgameResult(NamedTuple):
+    """
+    Result of solving an endgame.
+
+    Attributes:
+        move: the best move (None if the player to move has no moves)
+        score: the final disc difference (player to move minus opponent)
+            with perfect play. In win/loss/draw mode only its sign is
+            exact.
+        nodes: the number of positions visited
+    """
+    move: Optional[Tuple[int, int]]
+    score: int
+    nodes: int
+
+    @property
+    def outcome(self) -> str:
+        """
+        Returns "win", "loss" or "draw" for the player to move
+        """
+        if self.score > 0:
+            return "win"
+        if self.score < 0:
+            return "loss"
+        return "draw"
+
+
+class SolveAborted(Exception):
+    """
+    Raised when a solve runs out of time or is stopped
+    """
+
+
+class EndgameSolver:
+    """
+    Exact solver for two-player positions with at most max_empties
+    empty squares.
+    """
+
+    FASTEST_FIRST_EMPTIES = 6
+    """
+    Number of empty squares above which moves are sorted by the mobility
+    of the opponent. Closer to the end, parity ordering alone is cheaper.
+    """
+
+    CHECK_EVERY = 1024
+    """
+    Number of nodes between two checks of the clock.
+    """
+
+    def __init__(self, max_empties: int = 12, exact: bool = True):
+        """
+        Constructor
+
+        Args:
+            max_empties: the largest number of empty squares to solve
+            exact: if True, find the exact disc difference. Otherwise
+                only decide between win, loss and draw, which is faster.
+        """
+        self.max_empties = max_empties
+        self.exact = exact
+        self.nodes = 0
+        self._deadline: Optional[float] = None
+        self._stop: Optional[threading.Event] = None
+        self._rays: Tuple[Tuple[Tuple[int, ...], ...], ...] = ()
+        self._regions: List[int] = []
+
+    def can_solve(self, game: Union[Reversi, GameState]) -> bool:
+        """
+        Checks whether a position is in the range of the solver: a
+        two-player game past its opening, with at most max_empties
+        empty squares
+
+        Args:
+            game: the game (or game state)
+
+        Returns: True if solve can be called on the position
+        """
+        state = _as_state(game)
+        return (state.players == 2
+                and (state.othello or state.num_moves >= 4)
+                and state.empties <= self.max_empties)
+
+    def solve(self, game: Union[Reversi, GameState],
+              time_limit: Optional[float] = None,
+              stop: Optional[threading.Event] = None) -> EndgameResult:
+        """
+        Solves a position
+
+        Args:
+            game: the game (or game state) to solve
+            time_limit: maximum number of seconds to spend (or None)
+            stop: an event that aborts the solve when it is set (or None)
+
+        Raises:
+            ValueError: If can_solve is False for the position
+            SolveAborted: If the time limit runs out or the solve is
+                stopped
+
+        Returns: the best move and its score
+        """
+        state = _as_state(game)
+        if not self.can_solve(state):
+            raise ValueError("position is out of the range of the solver")
+        self.nodes = 0
+        self._deadline = None
+        self._stop = stop
+        if time_limit is not None:
+            self._deadline = time.perf_counter() + time_limit
+
+        side = state.side
+        board = list(state.board)
+        player = state.turn
+        opponent = 3 - player
+        diff = state.counters[player - 1] - state.counters[opponent - 1]
+        empties = [idx for idx, owner in enumerate(board) if owner == 0]
+        half = side // 2
+        self._rays = rays_table(side)
+        self._regions = [(idx // side >= half) * 2 + (idx % side >= half)
+                         for idx in range(side * side)]
+
+        if self.exact:
+            alpha, beta = -side * side - 1, side * side + 1
+        else:
+            alpha, beta = -1, 1
+        moves = self._moves(board, empties, player)
+        if not moves:
+            score = -self._negamax(board, empties, opponent, player, -diff,
+                                   -beta, -alpha, True)
+            return EndgameResult(None, score, self.nodes)
+
+        best_move = moves[0][0]
+        best_score = -side * side - 1
+        for idx, flips in self._order(board, empties, moves, opponent):
+            score = self._play(board, empties, idx, flips, player, opponent,
+                               diff, alpha, beta)
+            if score > best_score:
+                best_score = score
+                best_move = idx
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return EndgameResult(divmod(best_move, side), best_score, self.nodes)
+
+    def _moves(self, board: List[int], empties: List[int],
+               player: int) -> List[Tuple[int, List[int]]]:
+        """
+        Lists the moves of a player, with the pieces they flip
+        """
+        rays = self._rays
+        moves = []
+        for idx in empties:
+            flips = flipped_by(board, rays[idx], player)
+            if flips:
+                moves.append((idx, flips))
+        return moves
+
+    def _order(self, board: List[int], empties: List[int],
+               moves: List[Tuple[int, List[int]]],
+               opponent: int) -> List[Tuple[int, List[int]]]:
+        """
+        Sorts moves by parity, then (far enough from the end) by the
+        number of replies left to the opponent
+        """
+        parity = [0, 0, 0, 0]
+        for idx in empties:
+            parity[self._regions[idx]] ^= 1
+        if len(empties) <= self.FASTEST_FIRST_EMPTIES:
+            return sorted(moves, key=lambda m: -parity[self._regions[m[0]]])
+
+        rays = self._rays
+        keyed = []
+        for idx, flips in moves:
+            board[idx] = 3 - opponent
+            for flip in flips:
+                board[flip] = 3 - opponent
+            replies = sum(1 for e in empties
+                          if board[e] == 0
+                          and flipped_by(board, rays[e], opponent))
+            for flip in flips:
+                board[flip] = opponent
+            board[idx] = 0
+            keyed.append((replies, -parity[self._regions[idx]], idx, flips))
+        keyed.sort(key=lambda k: (k[0], k[1]))
+        return [(idx, flips) for _, _, idx, flips in keyed]
+
+    def _play(self, board: List[int], empties: List[int], idx: int,
+              flips: List[int], player: int, opponent: int, diff: int,
+              alpha: int, beta: int) -> int:
+        """
+        Makes a move, searches the resulting position and unmakes it
+
+        Returns: the score of the move for the player making it
+        """
+        board[idx] = player
+        for flip in flips:
+            board[flip] = player
+        rest = [e for e in empties if e != idx]
+        new_diff = diff + 1 + 2 * len(flips)
+        score = -self._negamax(board, rest, opponent, player, -new_diff,
+                               -beta, -alpha, False)
+        for flip in flips:
+            board[flip] = opponent
+        board[idx] = 0
+        return score
+
+    def _negamax(self, board: List[int], empties: List[int], player: int,
+                 opponent: int, diff: int, alpha: int, beta: int,
+                 passed: bool) -> int:
+        """
+        Negamax alpha-beta to the end of the game
+
+        Returns: the final disc difference for the player to move
+        """
+        self.nodes += 1
+        if self.nodes % self.CHECK_EVERY == 0:
+            if (self._deadline is not None
+                    and time.perf_counter() > self._deadline):
+                raise SolveAborted
+            if self._stop is not None and self._stop.is_set():
+                raise SolveAborted
+        moves = self._moves(board, empties, player)
+        if not moves:
+            if passed:
+                return diff
+            return -self._negamax(board, empties, opponent, player, -diff,
+                                  -beta, -alpha, True)
+        if len(moves) > 1:
+            moves = self._order(board, empties, moves, opponent)
+
+        best = -len(board) - 1
+        for idx, flips in moves:
+            score = self._play(board, empties, idx, flips, player, opponent,
+                               diff, alpha, beta)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+
+def _as_state(game: Union[Reversi, GameState]) -> GameState:
+    """
+    Returns the GameState of a game, or the state itself
+    """
+    if isinstance(game, Reversi):
+        return GameState.from_reversi(game)
+    return game
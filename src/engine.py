@@ -0,0 +1,353 @@
+"""
+Reversi engines running in their own process.
+
+An engine reads JSON messages from its standard input, one per line,
+and writes JSON messages to its standard output, loosely following the
+UCI protocol of chess engines:
+
+- {"cmd": "isready"}: the engine answers {"type": "readyok"}
+- {"cmd": "newgame"}: the engine forgets what it knows about the
+  previous game
+- {"cmd": "position", "side": 8, "players": 2, "othello": true,
+  "board": [...], "turn": 1, "num_moves": 4}: sets the position, the
+  board being packed in row-major order with 0 for empty squares
+- {"cmd": "go", "time_ms": 1000}: the engine searches the position
+  (time_ms may be null) and answers with {"type": "info", ...} lines
+  followed by {"type": "bestmove", "move": [row, col]}
+- {"cmd": "quit"}: the engine exits
+
+Errors are answered with {"type": "error", "message": "..."}.
+
+EngineClient starts an engine and talks to it; RemoteBot wraps a
+client in the Bot interface, so the GUI and TUI can use an engine in
+place of an in-process bot. Since the engine searches in another
+process, the GUI keeps drawing frames while it thinks.
+"""
+import json
+import queue
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, IO, List, Optional, Tuple
+
+from reversi import Reversi, GameState
+from bot import Bot, BOTS
+
+ENGINE_GRACE = 5.0
+"""
+Number of seconds an engine may take beyond its time limit before a
+client gives up on it.
+"""
+
+
+class EngineError(Exception):
+    """
+    Raised when an engine answers with an error, stops answering or
+    exits
+    """
+
+
+def engine_command(bot: str = "search") -> List[str]:
+    """
+    Returns the command that starts an engine playing with one of the
+    bots of bot.BOTS
+    """
+    return [sys.executable, __file__, bot]
+
+
+def position_message(game: Reversi) -> Dict[str, Any]:
+    """
+    Encodes the position of a game as a position command
+    """
+    state = GameState.from_reversi(game)
+    return {"cmd": "position", "side": state.side,
+            "players": state.players, "othello": state.othello,
+            "board": list(state.board), "turn": state.turn,
+            "num_moves": state.num_moves}
+
+
+def run_engine(factory: Callable[[int], Bot], infile: IO[str] = sys.stdin,
+               outfile: IO[str] = sys.stdout) -> None:
+    """
+    Runs an engine until it is told to quit or its input ends
+
+    Args:
+        factory: called with a player number, returns the bot that
+            plays for that player
+        infile: where commands are read
+        outfile: where answers are written
+
+    Returns: None
+    """
+    bots: Dict[int, Bot] = {}
+    game: Optional[Reversi] = None
+
+    def send(**message: Any) -> None:
+        outfile.write(json.dumps(message) + "\n")
+        outfile.flush()
+
+    try:
+        for line in infile:
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+                cmd = message["cmd"]
+                if cmd == "quit":
+                    break
+                elif cmd == "isready":
+                    send(type="readyok")
+                elif cmd == "newgame":
+                    for bot in bots.values():
+                        bot.close()
+                    bots.clear()
+                elif cmd == "position":
+                    state = GameState(
+                        message["side"], message["players"],
+                        message["othello"], tuple(message["board"]),
+                        message["turn"], message["num_moves"],
+                        tuple(message["board"].count(p) for p in
+                              range(1, message["players"] + 1)))
+                    game = state.to_reversi()
+                elif cmd == "go":
+                    if game is None:
+                        raise ValueError("no position was set")
+                    if game.turn not in bots:
+                        bots[game.turn] = factory(game.turn)
+                    start = time.perf_counter()
+                    move = bots[game.turn].choose_move(game,
+                                                       message.get("time_ms"))
+                    elapsed = time.perf_counter() - start
+                    send(type="info", time_ms=round(1000 * elapsed))
+                    send(type="bestmove", move=list(move))
+                else:
+                    raise ValueError(f"unknown command {cmd}")
+            except (ValueError, KeyError, TypeError) as e:
+                send(type="error", message=str(e))
+    finally:
+        for bot in bots.values():
+            bot.close()
+
+
+class EngineClient:
+    """
+    Connection to an engine running in a child process
+    """
+
+    def __init__(self, command: List[str]):
+        """
+        Constructor
+
+        Args:
+            command: the command that starts the engine
+        """
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, text=True,
+                                        bufsize=1)
+        self.messages: "queue.Queue[Optional[Dict[str, Any]]]" = \
+            queue.Queue()
+        self.info: Dict[str, Any] = {}
+        self.thinking = False
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        """
+        Queues the messages of the engine, then None when it exits
+        """
+        for line in self.process.stdout:
+            if line.strip():
+                self.messages.put(json.loads(line))
+        self.messages.put(None)
+
+    def send(self, message: Dict[str, Any]) -> None:
+        """
+        Sends a command to the engine
+
+        Raises:
+            EngineError: If the engine has exited
+        """
+        try:
+            self.process.stdin.write(json.dumps(message) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise EngineError("the engine has exited") from e
+
+    def receive(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Waits for the next message of the engine
+
+        Args:
+            timeout: number of seconds to wait (None to wait forever)
+
+        Raises:
+            EngineError: If the engine sends an error, exits, or sends
+                nothing in time
+
+        Returns: the message
+        """
+        try:
+            message = self.messages.get(timeout=timeout)
+        except queue.Empty:
+            raise EngineError("the engine is not answering") from None
+        if message is None:
+            self.messages.put(None)
+            raise EngineError("the engine has exited")
+        if message.get("type") == "error":
+            raise EngineError(message.get("message", "engine error"))
+        return message
+
+    def isready(self, timeout: Optional[float] = ENGINE_GRACE) -> None:
+        """
+        Waits until the engine is ready for commands
+
+        Raises:
+            EngineError: If the engine does not answer in time
+        """
+        self.send({"cmd": "isready"})
+        while self.receive(timeout).get("type") != "readyok":
+            pass
+
+    def newgame(self) -> None:
+        """
+        Tells the engine that a new game starts
+        """
+        self.send({"cmd": "newgame"})
+
+    def go(self, game: Reversi, time_ms: Optional[int] = None) -> None:
+        """
+        Sets the position of a game and starts a search, without waiting
+        for the result (see best_move and poll_best_move)
+
+        Args:
+            game: the game
+            time_ms: the time the engine may take, in milliseconds
+        """
+        self.send(position_message(game))
+        self.send({"cmd": "go", "time_ms": time_ms})
+        self.thinking = True
+
+    def _take(self, message: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        """
+        Handles a message received during a search
+
+        Returns: the best move if the message gives it, None otherwise
+        """
+        if message.get("type") == "info":
+            self.info = message
+        elif message.get("type") == "bestmove":
+            self.thinking = False
+            return tuple(message["move"])
+        return None
+
+    def best_move(self, timeout: Optional[float] = None) -> Tuple[int, int]:
+        """
+        Waits for the result of the current search
+
+        Args:
+            timeout: number of seconds to wait (None to wait forever)
+
+        Raises:
+            EngineError: If the engine fails to answer in time
+
+        Returns: the move found by the engine
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            left = None
+            if deadline is not None:
+                left = max(deadline - time.monotonic(), 0.0)
+            move = self._take(self.receive(left))
+            if move is not None:
+                return move
+
+    def poll_best_move(self) -> Optional[Tuple[int, int]]:
+        """
+        Checks, without waiting, whether the current search is over
+
+        Raises:
+            EngineError: If the engine has failed
+
+        Returns: the move found by the engine, or None if it is still
+            searching
+        """
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                return None
+            if message is None or message.get("type") == "error":
+                self.messages.put(message)
+                self.receive()
+            move = self._take(message)
+            if move is not None:
+                return move
+
+    def close(self, timeout: float = ENGINE_GRACE) -> None:
+        """
+        Tells the engine to quit, and kills it if it does not
+
+        Returns: None
+        """
+        try:
+            self.send({"cmd": "quit"})
+            self.process.stdin.close()
+        except (EngineError, OSError):
+            pass
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class RemoteBot(Bot):
+    """
+    Bot that lets an engine process choose its moves.
+
+    choose_move waits for the engine. A caller that must not block (such
+    as the GUI) calls request_move, then poll_move until it returns the
+    move.
+    """
+
+    def __init__(self, player: int, command: Optional[List[str]] = None):
+        """
+        Constructor
+
+        Args:
+            player: the player of the bot
+            command: the command that starts the engine
+                (engine_command() if None)
+        """
+        super().__init__(player)
+        self.client = EngineClient(command or engine_command())
+        self.client.isready()
+
+    def request_move(self, game: Reversi,
+                     deadline_ms: Optional[int] = None) -> None:
+        self.client.go(game, deadline_ms)
+
+    def poll_move(self) -> Optional[Tuple[int, int]]:
+        return self.client.poll_best_move()
+
+    def choose_move(self, game: Reversi,
+                    deadline_ms: Optional[int] = None) -> Tuple[int, int]:
+        self.request_move(game, deadline_ms)
+        timeout = None
+        if deadline_ms is not None:
+            timeout = deadline_ms / 1000 + ENGINE_GRACE
+        return self.client.best_move(timeout)
+
+    def close(self) -> None:
+        super().close()
+        self.client.close()
+
+
+if __name__ == '__main__':
+    name = sys.argv[1] if len(sys.argv) > 1 else "search"
+    if name not in BOTS:
+        print("Usage: python3 src/engine.py [BOT]", file=sys.stderr)
+        print("Bots: " + ", ".join(BOTS), file=sys.stderr)
+        sys.exit(1)
+    run_engine(BOTS[name])
@@ -0,0 +1,384 @@
+"""
+Table-driven evaluation of Reversi positions.
+
+A position is reduced to a few features, each computed from the point
+of view of one player as "own value minus the value of the strongest
+opponent":
+
+- squares: sum of per-square weights (corners good, X- and C-squares
+  bad, edges good)
+- edges: score of each board edge, looked up by its line code (the
+  owners of its squares read as a number in base players + 1)
+- mobility: number of squares where the player could place a piece
+- frontier: number of the player's pieces next to an empty square
+  (counted negatively, since they give the opponents moves)
+- discs: number of pieces
+
+The evaluation is the dot product of the features with a weight
+vector. All tables are computed once per board size and number of
+players.
+
+Evaluators also take whole batches of positions in one call
+(evaluate_batch and rewards_batch), which is what batched searches use
+and what a learned evaluator would implement. A batch scans each
+distinct position once, and derives the evaluations of every player
+from that scan.
+"""
+import functools
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from reversi import GameState, DIRECTIONS, rays_table, flipped_by
+
+CORNER = 20
+X_SQUARE = -10
+C_SQUARE = -5
+EDGE = 2
+INNER_RING = -1
+
+EDGE_ANCHOR = 3
+"""
+Edge pattern bonus for each piece in a run starting from an owned corner.
+"""
+
+EDGE_C_PENALTY = 4
+"""
+Edge pattern penalty for a piece on a C-square next to an empty corner.
+"""
+
+MAX_EDGE_TABLE = 1 << 17
+"""
+Largest number of line codes for which an edge table is built. Larger
+boards (or more players) score edges square by square.
+"""
+
+FEATURES = ["squares", "edges", "mobility", "frontier", "discs"]
+"""
+Names of the features, in the order of the feature vectors.
+"""
+
+DEFAULT_WEIGHTS = (1.0, 1.0, 3.0, 1.0, 0.0)
+"""
+Weights of the default evaluation, in the order of FEATURES.
+"""
+
+REWARD_TEMPERATURE = 20.0
+"""
+Default scale of evaluations when turning them into expected rewards.
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def square_table(side: int) -> Tuple[int, ...]:
+    """
+    Computes the weight of every square of a packed board
+
+    Args:
+        side: number of squares on each side of the board
+
+    Returns: the weights, indexed like a packed board
+    """
+    last = side - 1
+    weights = []
+    for row in range(side):
+        for col in range(side):
+            on_row_edge = row in (0, last)
+            on_col_edge = col in (0, last)
+            near_row = row in (1, last - 1)
+            near_col = col in (1, last - 1)
+            if on_row_edge and on_col_edge:
+                weights.append(CORNER)
+            elif near_row and near_col:
+                weights.append(X_SQUARE)
+            elif (on_row_edge and near_col) or (on_col_edge and near_row):
+                weights.append(C_SQUARE)
+            elif on_row_edge or on_col_edge:
+                weights.append(EDGE)
+            elif near_row or near_col:
+                weights.append(INNER_RING)
+            else:
+                weights.append(0)
+    return tuple(weights)
+
+
+@functools.lru_cache(maxsize=None)
+def edge_lines(side: int) -> Tuple[Tuple[int, ...], ...]:
+    """
+    Returns the packed indices of the four edges of the board, each from
+    one corner to the other
+    """
+    last = side - 1
+    return (tuple(range(side)),
+            tuple(last * side + col for col in range(side)),
+            tuple(row * side for row in range(side)),
+            tuple(row * side + last for row in range(side)))
+
+
+@functools.lru_cache(maxsize=None)
+def neighbors_table(side: int) -> Tuple[Tuple[int, ...], ...]:
+    """
+    Returns, for every square of a packed board, the indices of the
+    squares around it
+    """
+    table = []
+    for row in range(side):
+        for col in range(side):
+            table.append(tuple((row + dr) * side + col + dc
+                               for dr, dc in DIRECTIONS
+                               if 0 <= row + dr < side
+                               and 0 <= col + dc < side))
+    return tuple(table)
+
+
+def edge_pattern_score(line: Sequence[int], players: int) -> List[float]:
+    """
+    Scores one edge for every player: runs of pieces anchored in an
+    owned corner are rewarded, pieces on a C-square next to an empty
+    corner are penalized
+
+    Args:
+        line: the owners of the squares of the edge (0 for empty)
+        players: number of players
+
+    Returns: the score of each player (index player - 1)
+    """
+    scores = [0.0] * players
+    for corner, step in ((0, 1), (len(line) - 1, -1)):
+        owner = line[corner]
+        if owner:
+            idx = corner
+            while 0 <= idx < len(line) and line[idx] == owner:
+                scores[owner - 1] += EDGE_ANCHOR
+                idx += step
+        elif line[corner + step]:
+            scores[line[corner + step] - 1] -= EDGE_C_PENALTY
+    return scores
+
+
+@functools.lru_cache(maxsize=None)
+def edge_table(side: int, players: int
+               ) -> Optional[Tuple[Tuple[float, ...], ...]]:
+    """
+    Precomputes edge_pattern_score for every line code of an edge
+
+    Args:
+        side: number of squares on each side of the board
+        players: number of players
+
+    Returns: the scores, indexed by line code (None if the table would
+        have more than MAX_EDGE_TABLE entries)
+    """
+    base = players + 1
+    if base ** side > MAX_EDGE_TABLE:
+        return None
+    table = []
+    for code in range(base ** side):
+        line = []
+        for _ in range(side):
+            code, owner = divmod(code, base)
+            line.append(owner)
+        table.append(tuple(edge_pattern_score(line, players)))
+    return tuple(table)
+
+
+def line_code(board: Sequence[int], line: Sequence[int], base: int) -> int:
+    """
+    Reads the owners of the squares of a line as a number in the given
+    base, the first square being the least significant digit
+    """
+    code = 0
+    for idx in reversed(line):
+        code = code * base + board[idx]
+    return code
+
+
+def _relative(values: List[float], player: int) -> float:
+    """
+    Returns the value of the player minus the best value of the others
+    """
+    own = values[player - 1]
+    return own - max(v for p, v in enumerate(values, 1) if p != player)
+
+
+def raw_features(state: GameState) -> List[List[float]]:
+    """
+    Computes the value of every feature for every player, in one scan of
+    the board
+
+    Args:
+        state: the game state
+
+    Returns: for each feature, in the order of FEATURES, the value of
+        each player (index player - 1)
+    """
+    side = state.side
+    players = state.players
+    board = state.board
+    weights = square_table(side)
+    rays = rays_table(side)
+    neighbors = neighbors_table(side)
+
+    squares = [0.0] * players
+    frontier = [0.0] * players
+    mobility = [0.0] * players
+    for idx, owner in enumerate(board):
+        if owner:
+            squares[owner - 1] += weights[idx]
+            for near in neighbors[idx]:
+                if board[near] == 0:
+                    frontier[owner - 1] -= 1
+                    break
+        else:
+            for p in range(1, players + 1):
+                if flipped_by(board, rays[idx], p):
+                    mobility[p - 1] += 1
+
+    edges = [0.0] * players
+    table = edge_table(side, players)
+    for line in edge_lines(side):
+        if table is not None:
+            scores = table[line_code(board, line, players + 1)]
+        else:
+            scores = edge_pattern_score([board[idx] for idx in line],
+                                        players)
+        for i, score in enumerate(scores):
+            edges[i] += score
+
+    return [squares, edges, mobility, frontier,
+            [float(c) for c in state.counters]]
+
+
+def features(state: GameState, player: int) -> List[float]:
+    """
+    Computes the feature vector of a position for a player
+
+    Args:
+        state: the game state
+        player: the player to evaluate for
+
+    Returns: the features, in the order of FEATURES
+    """
+    return [_relative(values, player) for values in raw_features(state)]
+
+
+def _raw_batch(states: Sequence[GameState]) -> List[List[List[float]]]:
+    """
+    Computes the raw features of many positions, scanning each distinct
+    position once
+    """
+    seen: Dict[GameState, List[List[float]]] = {}
+    rows = []
+    for state in states:
+        raw = seen.get(state)
+        if raw is None:
+            raw = seen[state] = raw_features(state)
+        rows.append(raw)
+    return rows
+
+
+class Evaluator:
+    """
+    Evaluation function made of a weight vector over FEATURES. Instances
+    are callable with the same arguments as search.Evaluation.
+    """
+
+    def __init__(self, weights: Sequence[float] = DEFAULT_WEIGHTS):
+        """
+        Constructor
+
+        Args:
+            weights: the weight of each feature, in the order of FEATURES
+        """
+        if len(weights) != len(FEATURES):
+            raise ValueError(f"expected {len(FEATURES)} weights")
+        self.weights = tuple(weights)
+
+    def __call__(self, state: GameState, player: int) -> float:
+        return self._score(raw_features(state), player)
+
+    def _score(self, raw: List[List[float]], player: int) -> float:
+        """
+        Evaluates raw features (see raw_features) for a player
+        """
+        return sum(w * _relative(values, player)
+                   for w, values in zip(self.weights, raw))
+
+    def evaluate_batch(self, states: Sequence[GameState],
+                       player: Optional[int] = None) -> List[float]:
+        """
+        Evaluates many positions at once
+
+        Args:
+            states: the game states
+            player: the player to evaluate for (the player to move in
+                each state if None)
+
+        Returns: the evaluation of each state
+        """
+        return [self._score(raw, player or state.turn)
+                for state, raw in zip(states, _raw_batch(states))]
+
+    def rewards_batch(self, states: Sequence[GameState],
+                      temperature: float = REWARD_TEMPERATURE
+                      ) -> List[List[float]]:
+        """
+        Turns the evaluations of many positions into expected rewards:
+        for each position, a softmax over the evaluations of the players
+
+        Args:
+            states: the game states
+            temperature: the evaluation difference that makes a player
+                e times more likely to win than another
+
+        Returns: for each state, the reward of each player (index
+            player - 1), adding up to 1
+        """
+        rewards = []
+        for state, raw in zip(states, _raw_batch(states)):
+            scores = [self._score(raw, player)
+                      for player in range(1, state.players + 1)]
+            top = max(scores)
+            exps = [math.exp((score - top) / temperature)
+                    for score in scores]
+            total = sum(exps)
+            rewards.append([e / total for e in exps])
+        return rewards
+
+
+_default = Evaluator()
+
+
+def evaluate(state: GameState, player: int) -> float:
+    """
+    Evaluates a position for a player with the default weights
+
+    Args:
+        state: the game state
+        player: the player to evaluate for
+
+    Returns: the evaluation (higher is better for the player)
+    """
+    return _default(state, player)
+
+
+def evaluate_batch(states: Sequence[GameState],
+                   player: Optional[int] = None) -> List[float]:
+    """
+    Evaluates many positions with the default weights
+
+    Args:
+        states: the game states
+        player: the player to evaluate for (the player to move in each
+            state if None)
+
+    Returns: the evaluation of each state
+    """
+    return _default.evaluate_batch(states, player)
+
+
+def rewards_batch(states: Sequence[GameState]) -> List[List[float]]:
+    """
+    Returns the expected rewards of many positions with the default
+    weights (see Evaluator.rewards_batch)
+    """
+    return _default.rewards_batch(states)
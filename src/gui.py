@@ -2,13 +2,16 @@
 Reversi Game GUI using Pygame
 """
 import os
+import shlex
 import sys
 from typing import List, Tuple, Dict, Optional
 
 import pygame
 import pygame.font
 import click
-from reversi import Reversi
+from reversi import Reversi, MoveDelta
+from bot import Bot, SearchBot
+from engine import RemoteBot
 
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
 
@@ -85,7 +88,9 @@ class ReversiGui:
     clock : pygame.time.Clock
 
     def __init__(self, board_size: int = 8, window: int = 600, border: int = 40,
-                 num_of_plays: int = 2, othello: bool = True):
+                 num_of_plays: int = 2, othello: bool = True,
+                 bots: Optional[Dict[int, Bot]] = None,
+                 deadline_ms: int = 100, ponder: bool = False):
         """
         Constructor
 
@@ -95,6 +100,14 @@ class ReversiGui:
             board_size : int : number of squares on each side of board.
             num_of_plays : int : number of players in the game.
             othello: bool : True if board starts with four pieces in the center.
+            bots : dict : bots playing for some of the players, by number.
+            deadline_ms : int : time a bot may take for a move, so that a
+                frame is never stalled for longer.
+            ponder : bool : True if bots keep searching while a human
+                picks a move.
+
+        Bots that are RemoteBots search in their engine process while
+        frames keep being drawn; other bots search within the frame.
             
         """
         self.game_surface = pygame.surface.Surface((window, window))
@@ -111,6 +124,13 @@ class ReversiGui:
         self.rect_button = pygame.Rect(224, 400, 200, 50)
         self.start_button_status = False
         self.highlight_square = None
+        self.bots: Dict[int, Bot] = bots if bots is not None else {}
+        self.deadline_ms = deadline_ms
+        self.ponder = ponder
+        self.waiting_for_engine = False
+        self.legal_moves = set(self.game.available_moves)
+        self.game_over = self.game.done
+        self.game.add_listener(self.on_move)
 
 
         # Initialize Pygame
@@ -129,6 +149,22 @@ class ReversiGui:
 
         self.event_loop()
 
+    def on_move(self, delta: MoveDelta) -> None:
+        """
+        Updates the cached legal squares and game over flag after a move,
+        so that they are not re-derived from the grid on every frame
+
+        Parameters:
+            delta : MoveDelta : the changes made by the move
+
+        Returns: nothing
+        """
+        self.game_over = delta.game_over
+        if self.game_over:
+            self.legal_moves = set()
+        else:
+            self.legal_moves = set(self.game.available_moves)
+
     def draw_window(self) -> None:
         """
         Draws the contents of the window
@@ -170,7 +206,7 @@ class ReversiGui:
             for circle in circle_group:
                 circle.draw(self.surface)
         else:
-            if self.game.done:
+            if self.game_over:
                 print(self.game.outcome)
                 self.surface.fill((0, 0, 0))
                 if len(self.game.outcome) != 1:
@@ -236,7 +272,7 @@ class ReversiGui:
                     pygame.draw.rect(self.surface, color_dict[self.game.turn][\
                         0], high_rect, 20)
                 ###Adds new "legal" ReversiRects to GUI Board
-                moves = self.game.available_moves
+                moves = self.legal_moves
                 for i, row in enumerate(self.recs_in_grid):
                     for j, rect in enumerate(row):
                         if (i, j) in moves:
@@ -341,7 +377,8 @@ class ReversiGui:
                                 self.highlight_square = None
                         else:
                             self.highlight_square = None
-                    if event.type == pygame.MOUSEBUTTONUP:
+                    if event.type == pygame.MOUSEBUTTONUP and\
+                        self.game.turn not in self.bots:
                         mouse_pos = event.pos
                         if self.get_rect(mouse_pos)[0] is not None:
                             if self.get_rect(mouse_pos)[0] and\
@@ -349,11 +386,28 @@ class ReversiGui:
                                 self.highlight_square = None
                                 self.game.apply_move(self.get_rect(mouse_pos)[1]
                                                      )
-            if self.game.done:
+            if self.start and not self.game_over and\
+                self.game.turn in self.bots:
+                bot = self.bots[self.game.turn]
+                if isinstance(bot, RemoteBot):
+                    if not self.waiting_for_engine:
+                        bot.request_move(self.game, self.deadline_ms)
+                        self.waiting_for_engine = True
+                    move = bot.poll_move()
+                    if move is not None:
+                        self.waiting_for_engine = False
+                        self.game.apply_move(move)
+                        bot.moves.append(move)
+                else:
+                    bot.play_move(self.game, self.deadline_ms)
+                if self.ponder and not self.waiting_for_engine and\
+                    not self.game_over and self.game.turn not in self.bots:
+                    bot.ponder(self.game)
+            if self.game_over:
                 self.draw_window()
                 pygame.display.update()
                 self.clock.tick(40)
-                while self.game.done:
+                while self.game_over:
                     for event in pygame.event.get():
                         if event.type == pygame.QUIT:
                             pygame.quit()
@@ -401,8 +455,14 @@ class ReversiRect(pygame.Rect):
 @click.option('-s', '--board-size', type = click.INT, default = 8)
 @click.option('--othello', 'mode', flag_value = 'othello', default = True)
 @click.option('--non-othello', 'mode', flag_value = 'non-othello')
-
-def cmd(num_players: int, board_size: int, mode: str) -> None:
+@click.option('-b', '--bot', 'bot_players', type = click.INT, multiple = True)
+@click.option('--deadline-ms', type = click.INT, default = 100)
+@click.option('--ponder', is_flag = True)
+@click.option('-e', '--engine', type = click.STRING, default = None)
+
+def cmd(num_players: int, board_size: int, mode: str,
+        bot_players: Tuple[int, ...], deadline_ms: int, ponder: bool,
+        engine: Optional[str]) -> None:
     """
     Allows specifications for playing reveersi in the terminal
 
@@ -410,13 +470,25 @@ def cmd(num_players: int, board_size: int, mode: str) -> None:
         num_players: number of play6ers
         board_size: size of the board
         mode: othello or not othello
+        bot_players: numbers of the players played by a bot
+        deadline_ms: time a bot may take for a move, in milliseconds
+        ponder: whether bots keep searching while a human picks a move
+        engine: command starting an engine process for the bots (bots
+            run in the GUI process if None)
 
     Returns: None
     """
+    if engine is not None:
+        bots: Dict[int, Bot] = {n: RemoteBot(n, shlex.split(engine))
+                                for n in bot_players}
+    else:
+        bots = {n: SearchBot(n) for n in bot_players}
     if mode == 'othello':
-        game = ReversiGui(board_size, 600, 40, num_players, True)
+        game = ReversiGui(board_size, 600, 40, num_players, True, bots,
+                          deadline_ms, ponder)
     elif mode == 'non-othello':
-        game = ReversiGui(board_size, 600, 40, num_players, False)
+        game = ReversiGui(board_size, 600, 40, num_players, False, bots,
+                          deadline_ms, ponder)
     game.event_loop()
 if __name__ == "__main__":
     cmd()
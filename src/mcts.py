@@ -0,0 +1,314 @@
+"""
+Monte Carlo Tree Search (UCT) for Reversi with any number of players.
+
+Every node keeps, for each player, the total reward of the playouts
+that went through it: a playout gives 1 to a sole winner and splits it
+between tied winners. At each node, the player to move picks the child
+with the best upper confidence bound on its own reward.
+
+Searches can run in one process, or root-parallel: every worker process
+grows its own tree from the same position and the root visit counts are
+added up. A single-process search can keep its tree from one move to
+the next: the next search starts from the subtree of the position that
+was actually reached.
+
+Instead of random playouts, leaves can be scored by a batch evaluator:
+the search then selects several leaves before evaluating them all in
+one call.
+"""
+import math
+import random
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from reversi import GameState, legal_moves, play, random_playout
+
+
+BatchEvaluator = Callable[[Sequence[GameState]], List[List[float]]]
+"""
+Type for batch evaluators of leaves: take a list of game states, return
+for each the expected reward of every player (index player - 1).
+"""
+
+
+def rollout(state: GameState, rng: random.Random) -> List[float]:
+    """
+    Plays a game to the end with uniformly random moves
+
+    Args:
+        state: the state to start from
+        rng: the random number generator to use
+
+    Returns: the reward of each player (index player - 1)
+    """
+    return _rewards(random_playout(state, rng)[0])
+
+
+def _rewards(counters: List[int]) -> List[float]:
+    """
+    Splits a reward of 1 between the players with the most pieces
+    """
+    best = max(counters)
+    top = counters.count(best)
+    return [1.0 / top if count == best else 0.0 for count in counters]
+
+
+class Node:
+    """
+    Node of a search tree
+    """
+    __slots__ = ("state", "move", "parent", "children", "untried", "visits",
+                 "rewards")
+
+    def __init__(self, state: GameState, move: Optional[Tuple[int, int]] = None,
+                 parent: Optional["Node"] = None):
+        """
+        Constructor
+
+        Args:
+            state: the state of the node
+            move: the move that led from the parent to this node
+            parent: the parent node (None for the root)
+        """
+        self.state = state
+        self.move = move
+        self.parent = parent
+        self.children: List["Node"] = []
+        self.untried = legal_moves(state)
+        self.visits = 0
+        self.rewards = [0.0] * state.players
+
+    def select(self, exploration: float) -> "Node":
+        """
+        Picks the child with the best upper confidence bound for the
+        player to move
+
+        Args:
+            exploration: the exploration constant
+
+        Returns: the selected child
+        """
+        me = self.state.turn - 1
+        log_visits = math.log(self.visits)
+        return max(self.children,
+                   key=lambda child: child.rewards[me] / child.visits
+                   + exploration * math.sqrt(log_visits / child.visits))
+
+
+class MCTS:
+    """
+    UCT search
+    """
+
+    def __init__(self, exploration: float = 1.4,
+                 rng: Optional[random.Random] = None,
+                 evaluator: Optional[BatchEvaluator] = None,
+                 batch_size: int = 8):
+        """
+        Constructor
+
+        Args:
+            exploration: the exploration constant of the UCT formula
+            rng: the random number generator (a new one if None)
+            evaluator: if given, leaves are not played out but evaluated
+                by this function, batch_size at a time (for example
+                evaluation.rewards_batch)
+            batch_size: number of leaves evaluated together
+        """
+        self.exploration = exploration
+        self.rng = rng if rng is not None else random.Random()
+        self.evaluator = evaluator
+        self.batch_size = batch_size
+        self.root: Optional[Node] = None
+
+    def search(self, state: GameState, time_limit: Optional[float] = None,
+               iterations: Optional[int] = None, reuse: bool = False,
+               stop: Optional[threading.Event] = None
+               ) -> Dict[Tuple[int, int], int]:
+        """
+        Grows a tree from a state
+
+        Args:
+            state: the state to search
+            time_limit: number of seconds to search for (or None)
+            iterations: number of playouts to run (or None), rounded up
+                to whole batches. If both limits and stop are None, a
+                single playout (or batch) is run.
+            reuse: whether to keep growing the subtree of the state if
+                the previous tree reached it
+            stop: an event that ends the search when it is set (or None)
+
+        Returns: the number of visits of each move at the root
+        """
+        if not (reuse and self.reroot(state)):
+            self.root = Node(state)
+        deadline = None
+        if time_limit is not None:
+            deadline = time.perf_counter() + time_limit
+        done = 0
+        while True:
+            done += self.iterate()
+            if iterations is not None and done >= iterations:
+                break
+            if stop is not None and stop.is_set():
+                break
+            if deadline is None:
+                if iterations is None and stop is None:
+                    break
+            elif time.perf_counter() > deadline:
+                break
+        return self.visit_counts()
+
+    def reroot(self, state: GameState) -> bool:
+        """
+        Makes the node of a state the root of the tree, if it is one of
+        the nodes reached from the root in at most one move per player
+
+        Args:
+            state: the state to look for
+
+        Returns: True if the node was found
+        """
+        if self.root is None:
+            return False
+        level = [self.root]
+        for _ in range(state.players + 1):
+            for node in level:
+                if node.state == state:
+                    node.parent = None
+                    node.move = None
+                    self.root = node
+                    return True
+            level = [child for node in level for child in node.children]
+        return False
+
+    def iterate(self) -> int:
+        """
+        Runs one selection, expansion, playout and backpropagation, or
+        one batch of them if the search has a batch evaluator
+
+        Returns: the number of playouts (or evaluated leaves) run
+        """
+        if self.evaluator is not None:
+            return self.iterate_batch()
+        node = self._descend()
+        if node.untried:
+            rewards = rollout(node.state, self.rng)
+        else:
+            rewards = _rewards(list(node.state.counters))
+        self._backup(node, rewards, True)
+        return 1
+
+    def iterate_batch(self) -> int:
+        """
+        Selects and expands batch_size leaves, evaluates them all with
+        one call to the evaluator, and backpropagates the results. Each
+        selected path counts as visited (with no reward yet) as soon as
+        it is selected, which steers the next selections of the batch
+        elsewhere.
+
+        Returns: the number of leaves evaluated
+        """
+        leaves = []
+        for _ in range(self.batch_size):
+            leaf = self._descend()
+            node = leaf
+            while node is not None:
+                node.visits += 1
+                node = node.parent
+            leaves.append(leaf)
+        open_leaves = [leaf for leaf in leaves if leaf.untried]
+        values = iter(self.evaluator([leaf.state for leaf in open_leaves]))
+        for leaf in leaves:
+            if leaf.untried:
+                rewards = next(values)
+            else:
+                rewards = _rewards(list(leaf.state.counters))
+            self._backup(leaf, rewards, False)
+        return len(leaves)
+
+    def _descend(self) -> Node:
+        """
+        Selects a node from the root, and expands it by one untried move
+        if it has any
+
+        Returns: the expanded child, or the selected node if it has no
+            untried moves (the game is over there)
+        """
+        node = self.root
+        while not node.untried and node.children:
+            node = node.select(self.exploration)
+        if node.untried:
+            move = node.untried.pop(self.rng.randrange(len(node.untried)))
+            child = Node(play(node.state, move), move, node)
+            node.children.append(child)
+            node = child
+        return node
+
+    def _backup(self, node: Node, rewards: List[float], visit: bool) -> None:
+        """
+        Adds rewards (and a visit, if visit is True) to a node and all
+        its ancestors
+        """
+        while node is not None:
+            if visit:
+                node.visits += 1
+            for i, reward in enumerate(rewards):
+                node.rewards[i] += reward
+            node = node.parent
+
+    def visit_counts(self) -> Dict[Tuple[int, int], int]:
+        """
+        Returns the number of visits of each move at the root
+        """
+        return {child.move: child.visits for child in self.root.children}
+
+
+def best_move(counts: Dict[Tuple[int, int], int]) -> Tuple[int, int]:
+    """
+    Picks the most visited move (the first in row-major order on ties)
+    """
+    return max(sorted(counts), key=lambda move: counts[move])
+
+
+def _search_worker(state: GameState, time_limit: Optional[float],
+                   iterations: Optional[int],
+                   seed: int) -> Dict[Tuple[int, int], int]:
+    """
+    Runs a search in a worker process
+    """
+    return MCTS(rng=random.Random(seed)).search(state, time_limit, iterations)
+
+
+def parallel_search(executor: Executor, state: GameState, workers: int,
+                    time_limit: Optional[float] = None,
+                    iterations: Optional[int] = None,
+                    seed: Optional[int] = None) -> Dict[Tuple[int, int], int]:
+    """
+    Root-parallel search: each worker grows its own tree from the state
+    and the visit counts of the root moves are added up
+
+    Args:
+        executor: the executor (usually a ProcessPoolExecutor) to run
+            the workers on
+        state: the state to search
+        workers: number of trees to grow
+        time_limit: number of seconds each worker searches for
+        iterations: number of playouts of each worker
+        seed: seed from which the seeds of the workers are derived
+            (random if None)
+
+    Returns: the total number of visits of each move at the root
+    """
+    if seed is None:
+        seed = random.getrandbits(32)
+    futures = [executor.submit(_search_worker, state, time_limit, iterations,
+                               seed + i)
+               for i in range(workers)]
+    totals: Dict[Tuple[int, int], int] = {}
+    for future in futures:
+        for move, visits in future.result().items():
+            totals[move] = totals.get(move, 0) + visits
+    return totals
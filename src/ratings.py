@@ -0,0 +1,215 @@
+"""
+Ratings of bots from tournament results.
+
+Ratings reads the JSON lines written by tournament.run_tournament as
+they arrive. Every game updates Elo ratings at once, and adds to a
+matrix of points scored between each pair of bots. Bradley-Terry
+ratings are refitted from that matrix every so many games (or on
+demand), warm-started from the previous fit, so the cost of a refit
+depends on the number of bots and not on the number of games.
+
+Games with more than two players count as one game between every pair
+of seats: a winner beats a non-winner, and two winners (or two
+non-winners) draw.
+"""
+import json
+import math
+import sys
+from typing import Any, Dict, IO, Iterable, List, Union
+
+
+class Ratings:
+    """
+    Elo and Bradley-Terry ratings of any number of bots, identified by
+    name
+    """
+
+    def __init__(self, k: float = 16.0, initial: float = 1500.0,
+                 refit_every: int = 10000, prior: float = 1.0):
+        """
+        Constructor
+
+        Args:
+            k: the Elo K-factor of a two-player game
+            initial: the rating of a new bot, and the mean of the
+                Bradley-Terry ratings
+            refit_every: number of games between two Bradley-Terry refits
+                when consuming results (0 to refit only on demand)
+            prior: number of virtual draws of each bot against an average
+                bot, which keeps the ratings of unbeaten (or winless) bots
+                finite
+        """
+        self.k = k
+        self.initial = initial
+        self.refit_every = refit_every
+        self.prior = prior
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.elo: List[float] = []
+        self.points: List[List[float]] = []
+        self.played: List[List[int]] = []
+        self.strengths: List[float] = []
+        self.games = 0
+
+    def _bot(self, name: str) -> int:
+        """
+        Returns the index of a bot, adding it if it is new
+        """
+        if name not in self.index:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+            self.elo.append(self.initial)
+            self.strengths.append(1.0)
+            for row in self.points:
+                row.append(0.0)
+            for row in self.played:
+                row.append(0)
+            self.points.append([0.0] * len(self.names))
+            self.played.append([0] * len(self.names))
+        return self.index[name]
+
+    def add(self, result: Dict[str, Any]) -> None:
+        """
+        Counts the result of one game
+
+        Args:
+            result: a result as written by tournament.run_tournament
+
+        Returns: None
+        """
+        bots = [self._bot(name) for name in result["bots"]]
+        winners = set(result["winners"])
+        won = [seat + 1 in winners for seat in range(len(bots))]
+        k = self.k / max(len(bots) - 1, 1)
+        for a in range(len(bots)):
+            for b in range(a + 1, len(bots)):
+                i, j = bots[a], bots[b]
+                if i == j:
+                    continue
+                score = 0.5 if won[a] == won[b] else float(won[a])
+                expected = 1 / (1 + 10 ** ((self.elo[j] - self.elo[i])
+                                           / 400))
+                self.elo[i] += k * (score - expected)
+                self.elo[j] -= k * (score - expected)
+                self.points[i][j] += score
+                self.points[j][i] += 1 - score
+                self.played[i][j] += 1
+                self.played[j][i] += 1
+        self.games += 1
+        if self.refit_every and self.games % self.refit_every == 0:
+            self.refit()
+
+    def consume(self, lines: Iterable[Union[str, Dict[str, Any]]]) -> int:
+        """
+        Counts the results of many games
+
+        Args:
+            lines: JSON lines (or already decoded results), for example an
+                open results file. Blank lines are skipped.
+
+        Returns: the number of games counted
+        """
+        count = 0
+        for line in lines:
+            if isinstance(line, str):
+                if not line.strip():
+                    continue
+                line = json.loads(line)
+            self.add(line)
+            count += 1
+        return count
+
+    def refit(self, max_iterations: int = 1000, tolerance: float = 1e-9
+              ) -> int:
+        """
+        Fits the Bradley-Terry strengths to the points matrix with the
+        minorization-maximization algorithm, starting from the last fit
+
+        Args:
+            max_iterations: the largest number of iterations
+            tolerance: the largest relative change of a strength at which
+                the fit stops
+
+        Returns: the number of iterations done
+        """
+        n = len(self.names)
+        strengths = self.strengths
+        half_prior = self.prior / 2
+        for iteration in range(1, max_iterations + 1):
+            change = 0.0
+            updated = []
+            for i in range(n):
+                p_i = strengths[i]
+                total = half_prior + sum(self.points[i])
+                denominator = self.prior / (p_i + 1)
+                for j, games in enumerate(self.played[i]):
+                    if games:
+                        denominator += games / (p_i + strengths[j])
+                new = total / denominator
+                change = max(change, abs(new - p_i) / p_i)
+                updated.append(new)
+            strengths = updated
+            if change < tolerance:
+                break
+        self.strengths = strengths
+        return iteration
+
+    @property
+    def bradley_terry(self) -> Dict[str, float]:
+        """
+        Returns the Bradley-Terry ratings of the last fit, on the Elo
+        scale and centered on the initial rating
+        """
+        if not self.names:
+            return {}
+        logs = [400 * math.log10(p) for p in self.strengths]
+        mean = sum(logs) / len(logs)
+        return {name: self.initial + rating - mean
+                for name, rating in zip(self.names, logs)}
+
+    @property
+    def elo_ratings(self) -> Dict[str, float]:
+        """
+        Returns the current Elo ratings
+        """
+        return dict(zip(self.names, self.elo))
+
+    def report(self) -> str:
+        """
+        Returns one line per bot, best Bradley-Terry rating first
+        """
+        bt = self.bradley_terry
+        lines = [f"after {self.games} games:"]
+        for name in sorted(self.names, key=lambda n: -bt[n]):
+            i = self.index[name]
+            lines.append(f"  {name}: Bradley-Terry {bt[name]:.1f} "
+                         f"Elo {self.elo[i]:.1f} "
+                         f"games {sum(self.played[i])}")
+        return "\n".join(lines)
+
+
+def rate_file(f: IO[str], **kwargs) -> Ratings:
+    """
+    Rates the bots of a results file
+
+    Args:
+        f: the open file
+        kwargs: arguments of the Ratings constructor
+
+    Returns: the ratings, refitted after the last game
+    """
+    ratings = Ratings(**kwargs)
+    ratings.consume(f)
+    ratings.refit()
+    return ratings
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python3 src/ratings.py RESULTS_FILE (- for stdin)")
+        sys.exit(1)
+    if sys.argv[1] == "-":
+        print(rate_file(sys.stdin).report())
+    else:
+        with open(sys.argv[1]) as results:
+            print(rate_file(results).report())
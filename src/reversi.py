@@ -4,9 +4,14 @@ Reversi implementation.
 Contains a base class (ReversiBase). You must implement
 a Reversi class that inherits from this base class.
 """
+import functools
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from enum import Enum
-from typing import List, Dict, Tuple, Optional
+from typing import (Any, Callable, List, Dict, NamedTuple, Set, Tuple,
+                    Optional)
 
 PieceColor = Enum("PieceColor", ["BLACK", "WHITE", "RED", "GREEN", "YELLOW",
                                  "BLUE", "MAGENTA", "CYAN", "VIOLET"])
@@ -54,6 +59,30 @@ Type for representing lists of moves on the board.
 """
 
 
+class MoveDelta(NamedTuple):
+    """
+    Summary of the changes made to a game by a single move, as published
+    to the listeners of a Reversi game.
+
+    Attributes:
+        position: the square where the piece was placed
+        player: the player who placed the piece, and the new owner of
+            every flipped square
+        flipped: the squares that changed owner
+        old_owners: the previous owner of each square in flipped
+        turn: the player who moves next (meaningless if game_over)
+        skipped: the players who were skipped because they had no moves
+        game_over: whether no player can make a move anymore
+    """
+    position: Tuple[int, int]
+    player: int
+    flipped: ListMovesType
+    old_owners: List[int]
+    turn: int
+    skipped: List[int]
+    game_over: bool
+
+
 class ReversiBase(ABC):
     """
     Abstract base class for the game of Reversi
@@ -315,7 +344,7 @@ class Board():
     _rows: int
     _cols: int
     _board: List[List[Optional[int]]]
-    _piece_locations: Dict[int, List[Piece]]
+    _piece_locations: Optional[Dict[int, List[Piece]]]
     _ghost_locations: Dict[Tuple[int, int], List[Tuple[int, int]]]
 
     def __init__(self, size: int):
@@ -351,8 +380,30 @@ class Board():
         """
         returns piece locations
         """
+        if self._piece_locations is None:
+            self._piece_locations = {}
+            for row, line in enumerate(self._board):
+                for col, player in enumerate(line):
+                    if player is not None:
+                        self._piece_locations.setdefault(player, []).append(
+                            Piece(player, color_dict[player], (row, col)))
         return self._piece_locations
 
+    def fill(self, packed: Any) -> None:
+        """
+        Replaces the contents of the board with a packed board. The piece
+        locations are only rebuilt when they are next needed.
+
+        Inputs:
+            packed (sequence): the board, row by row, with 0 for empty
+                squares
+        """
+        size = self._cols
+        self._board = [[piece or None for piece in packed[i:i + size]]
+                       for i in range(0, size * size, size)]
+        self._piece_locations = None
+        self._ghost_locations = {}
+
     @property
     def ghost_locations(self):
         """
@@ -453,6 +504,8 @@ class Reversi(ReversiBase):
             for i in range(1, players + 1):
                 self.player_counter[i] = 0
         self._turn = 1
+        self._listeners: List[Callable[[MoveDelta], None]] = []
+        self._stable: Optional[Dict[int, Set[Tuple[int, int]]]] = None
 
 
     @property
@@ -473,6 +526,8 @@ class Reversi(ReversiBase):
 
     @property
     def available_moves(self) -> ListMovesType:
+        if _move_cache is not None:
+            return [move for move, _ in self._cached_moves()]
         moves_lst = []
         for row in range(self._side):
             for col in range(self._side):
@@ -480,6 +535,45 @@ class Reversi(ReversiBase):
                     moves_lst.append((row, col))
         return moves_lst
 
+    def move_flips(self) -> Dict[Tuple[int, int], int]:
+        """
+        Counts, in one pass over the board, the pieces each legal move of
+        the player to move would flip
+
+        Returns: a dict from every legal move, in the order of
+            available_moves, to the number of pieces it flips
+        """
+        if _move_cache is not None:
+            return {move: len(flips) for move, flips in self._cached_moves()}
+        side = self._side
+        board = [piece or 0 for row in self.grid for piece in row]
+        moves = _moves_with_flips(board, side, self._players, self._othello,
+                                  self._num_moves, self._turn)
+        return {divmod(idx, side): len(flips) for idx, flips in moves}
+
+    def _cached_moves(self) -> "MoveList":
+        """
+        Looks up the legal moves of the player to move, and the pieces
+        each one flips, in the move cache, computing and storing them on
+        a miss. Only called while the move cache is enabled.
+
+        Returns: (move, flipped positions) pairs, in row-major order
+        """
+        cache = _move_cache
+        side = self._side
+        board = bytes(piece or 0 for row in self.grid for piece in row)
+        opening = self._num_moves < self._players ** 2 and not self._othello
+        key = (board, self._turn, self._players, opening)
+        entry = cache.get(key)
+        if entry is None:
+            entry = tuple(
+                (divmod(idx, side), tuple(divmod(i, side) for i in flips))
+                for idx, flips in _moves_with_flips(
+                    board, side, self._players, self._othello,
+                    self._num_moves, self._turn))
+            cache.put(key, entry)
+        return entry
+
     @property
     def done(self) -> bool:
         turn = self._turn
@@ -493,6 +587,24 @@ class Reversi(ReversiBase):
                 self._turn += 1
         return True
 
+    @property
+    def stable_discs(self) -> Dict[int, Set[Tuple[int, int]]]:
+        """
+        Returns, for each player, the set of positions of their pieces
+        that can never be flipped again.
+
+        The sets are computed from scratch the first time this property
+        is used after creating or loading a game, and are then updated
+        by every apply_move. They must not be modified.
+        """
+        if self._stable is None:
+            self._stable = {i: set() for i in range(1, self._players + 1)}
+            occupied = [(r, c) for r in range(self._side)
+                        for c in range(self._side)
+                        if self.grid[r][c] is not None]
+            grow_stable(self.grid, self._stable, occupied)
+        return self._stable
+
     @property
     def outcome(self) -> List[int]:
         winner: List[int] = []
@@ -510,6 +622,33 @@ class Reversi(ReversiBase):
 
     # Methods
 
+    def add_listener(self, listener: Callable[["MoveDelta"], None]) -> None:
+        """
+        Registers a function that is called with a MoveDelta every time
+        a move is applied to this game
+
+        Args:
+            listener: the function to call
+
+        Returns: None
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[["MoveDelta"], None]
+                        ) -> None:
+        """
+        Unregisters a function previously passed to add_listener
+
+        Args:
+            listener: the function to remove
+
+        Raises:
+            ValueError: If the function is not registered
+
+        Returns: None
+        """
+        self._listeners.remove(listener)
+
     def piece_at(self, pos: Tuple[int, int]) -> Optional[int]:
         row, col = pos
         if not 0 <= row < self._side or not 0 <= col < self._side:
@@ -549,18 +688,7 @@ class Reversi(ReversiBase):
         
         Returns: a list of tuples that is all the squares in the center
         """
-        result = []
-        center = self._side // 2
-        if self._side % 2 == 0:
-            lower = center - (self.num_players // 2)
-            upper = center + (self.num_players // 2) - 1
-        else:
-            lower = center - (self.num_players // 2)
-            upper = center + (self.num_players // 2)
-        for i in range(lower, upper + 1):
-            for j in range(lower, upper + 1):
-                result.append((i, j))
-        return result
+        return center_squares(self._side, self._players)
 
     def can_move(self, loc: Tuple[int, int],
                 d: Tuple[int, int]) -> Optional[Tuple[int, int]]:
@@ -609,6 +737,8 @@ class Reversi(ReversiBase):
         if not self.legal_move(pos):
             raise ValueError("move is not legal")
 
+        flipped: ListMovesType = []
+        old_owners: List[int] = []
         dirx_list = self._grid.ghost_locations[pos]
         for dirx in dirx_list:
             to_update_list = []
@@ -630,7 +760,10 @@ class Reversi(ReversiBase):
                     correct = True
             if correct:
                 for loc in to_update_list:
-                    self.player_counter[self.piece_at(loc)] -= 1
+                    old_owner = self.piece_at(loc)
+                    flipped.append(loc)
+                    old_owners.append(old_owner)
+                    self.player_counter[old_owner] -= 1
                     self._grid.add_piece(Piece(player, color_dict[self._turn],
                                             (loc)))
                     self.player_counter[player] += 1
@@ -640,14 +773,74 @@ class Reversi(ReversiBase):
         curr = self._turn
         self._turn = self._turn % self.num_players + 1
         c = 0
+        skipped = []
+        found = False
         while curr != self._turn:
             if c != 0:
+                skipped.append(self._turn)
                 self._turn = self._turn % self.num_players + 1
             c+= 1
             self._num_moves += 1
             if self.available_moves:
+                found = True
                 break
 
+        if self._stable is not None:
+            candidates = [pos] + flipped
+            for line in lines_through(pos, self._side):
+                if all(self.grid[r][c] is not None for r, c in line):
+                    candidates.extend(line)
+            grow_stable(self.grid, self._stable, candidates)
+
+        if self._listeners:
+            game_over = not found and not self.available_moves
+            delta = MoveDelta(pos, player, flipped, old_owners, self._turn,
+                              skipped, game_over)
+            for listener in list(self._listeners):
+                listener(delta)
+
+    def __getstate__(self) -> Tuple[int, int, bool, bytes, int, int]:
+        """
+        Reduces the game to its packed board, turn, move counter and
+        configuration for pickling. Listeners are not pickled.
+        """
+        packed = bytes(piece or 0 for row in self.grid for piece in row)
+        return (self._side, self._players, self._othello, packed,
+                self._turn, self._num_moves)
+
+    def __setstate__(self, state: Tuple[int, int, bool, bytes, int, int]
+                     ) -> None:
+        """
+        Rebuilds a game pickled with __getstate__
+        """
+        side, players, othello, packed, turn, num_moves = state
+        ReversiBase.__init__(self, side, players, othello)
+        self.center = self.produce_center_square()
+        self._listeners = []
+        self._restore(packed, turn, num_moves)
+
+    def _restore(self, board: Any, turn: int, num_moves: int) -> None:
+        """
+        Replaces the state of the game with a packed board, without any
+        validation
+
+        Args:
+            board: packed board, row by row, with 0 for empty squares
+            turn: the player who must make the next move
+            num_moves: the move counter
+
+        Returns: None
+        """
+        self._grid = Board(self._side)
+        self._grid.fill(board)
+        self.player_counter = {i: 0 for i in range(1, self._players + 1)}
+        for piece in board:
+            if piece:
+                self.player_counter[piece] += 1
+        self._turn = turn
+        self._num_moves = num_moves
+        self._stable = None
+
     def load_game(self, turn: int, grid: BoardGridType) -> None:
         counter = 0
         if len(grid) != self._side or len(grid[0]) != self._side:
@@ -672,6 +865,7 @@ class Reversi(ReversiBase):
                     self._grid.board[i][j] = None
         self._turn = turn
         self._num_moves = counter
+        self._stable = None
 
     def simulate_moves(self, moves: ListMovesType) -> "ReversiBase":
         rev = Reversi(self._side, self._players, self._othello)
@@ -684,3 +878,719 @@ class Reversi(ReversiBase):
             if rev.legal_move(move) and (move in rev.available_moves):
                 rev.apply_move(move)
         return rev
+
+    def simulate_many(self, sequences: List[ListMovesType],
+                      reduce: Optional[Callable[["Reversi"], Any]] = None
+                      ) -> List[Any]:
+        """
+        Simulates many sequences of moves from the current position,
+        without altering the state of the game. Like simulate_moves,
+        moves that are not legal when their turn comes are skipped.
+
+        The sequences are arranged in a prefix trie, so a prefix shared
+        by several sequences is played only once, on immutable game
+        states; a game is only built for the end of each sequence.
+
+        Args:
+            sequences: the sequences of moves
+            reduce: function applied to the game reached by each
+                sequence (None to return the games themselves)
+
+        Raises:
+            ValueError: If any position is outside the bounds of the
+                board
+
+        Returns: the game (or its reduction) reached by each sequence,
+            in the order of the sequences
+        """
+        root: Dict[Any, Any] = {}
+        ends: Dict[int, List[int]] = {}
+        for i, moves in enumerate(sequences):
+            node = root
+            for row, col in moves:
+                if not 0 <= row < self._side or not 0 <= col < self._side:
+                    raise ValueError("the specified position is outside "
+                                     "the bounds of the board")
+                node = node.setdefault((row, col), {})
+            ends.setdefault(id(node), []).append(i)
+
+        results: List[Any] = [None] * len(sequences)
+
+        def visit(node: Dict[Any, Any], state: GameState) -> None:
+            for i in ends.get(id(node), ()):
+                rev = state.to_reversi()
+                results[i] = rev if reduce is None else reduce(rev)
+            legal = set(legal_moves(state)) if node else set()
+            for move, child in node.items():
+                visit(child, play(state, move) if move in legal else state)
+
+        visit(root, GameState.from_reversi(self))
+        return results
+
+
+#
+# IMMUTABLE GAME STATE
+#
+
+DIRECTIONS = [(0, 1), (0, -1), (1, 0), (-1, 0), (-1, -1), (-1, 1),
+              (1, 1), (1, -1)]
+"""
+The eight directions in which pieces can be flipped.
+"""
+
+
+def center_squares(side: int, players: int) -> List[Tuple[int, int]]:
+    """
+    Gives the center squares where the first players ** 2 pieces of a
+    non-Othello game must be placed
+
+    Args:
+        side: number of squares on each side of the board
+        players: number of players
+
+    Returns: a list of tuples that is all the squares in the center
+    """
+    result = []
+    center = side // 2
+    if side % 2 == 0:
+        lower = center - (players // 2)
+        upper = center + (players // 2) - 1
+    else:
+        lower = center - (players // 2)
+        upper = center + (players // 2)
+    for i in range(lower, upper + 1):
+        for j in range(lower, upper + 1):
+            result.append((i, j))
+    return result
+
+
+def lines_through(pos: Tuple[int, int], side: int) -> List[ListMovesType]:
+    """
+    Gives the four lines (row, column and both diagonals) that go through
+    a square, from edge to edge
+
+    Args:
+        pos: the square
+        side: number of squares on each side of the board
+
+    Returns: a list of four lists of positions
+    """
+    row, col = pos
+    lines = []
+    for dr, dc in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+        r, c = row, col
+        while 0 <= r - dr < side and 0 <= c - dc < side:
+            r -= dr
+            c -= dc
+        line = []
+        while 0 <= r < side and 0 <= c < side:
+            line.append((r, c))
+            r += dr
+            c += dc
+        lines.append(line)
+    return lines
+
+
+def _is_stable(grid: BoardGridType, stable: Dict[int, Set[Tuple[int, int]]],
+               pos: Tuple[int, int]) -> bool:
+    """
+    Checks whether a piece can never be flipped, given the pieces already
+    known to be stable. Along each of its four lines, the piece must
+    either be next to the edge of the board, be next to a stable piece
+    of the same player, or be on a full line.
+    """
+    side = len(grid)
+    row, col = pos
+    owner = grid[row][col]
+    own_stable = stable[owner]
+    for dr, dc in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+        anchored = False
+        for r, c in ((row + dr, col + dc), (row - dr, col - dc)):
+            if not (0 <= r < side and 0 <= c < side) or (r, c) in own_stable:
+                anchored = True
+                break
+        if anchored:
+            continue
+        r, c = row, col
+        while 0 <= r < side and 0 <= c < side:
+            if grid[r][c] is None:
+                return False
+            r += dr
+            c += dc
+        r, c = row, col
+        while 0 <= r < side and 0 <= c < side:
+            if grid[r][c] is None:
+                return False
+            r -= dr
+            c -= dc
+    return True
+
+
+def grow_stable(grid: BoardGridType, stable: Dict[int, Set[Tuple[int, int]]],
+                candidates: List[Tuple[int, int]]) -> None:
+    """
+    Adds to the stable pieces every candidate (and, transitively, every
+    neighbor of a newly stable piece) that has become stable
+
+    Args:
+        grid: the board
+        stable: the stable pieces of each player, updated in place
+        candidates: the positions that may have become stable
+
+    Returns: None
+    """
+    side = len(grid)
+    work = list(candidates)
+    while work:
+        pos = work.pop()
+        owner = grid[pos[0]][pos[1]]
+        if owner is None or pos in stable[owner]:
+            continue
+        if _is_stable(grid, stable, pos):
+            stable[owner].add(pos)
+            row, col = pos
+            for dr, dc in DIRECTIONS:
+                if 0 <= row + dr < side and 0 <= col + dc < side:
+                    work.append((row + dr, col + dc))
+
+
+@functools.lru_cache(maxsize=None)
+def rays_table(side: int) -> Tuple[Tuple[Tuple[int, ...], ...], ...]:
+    """
+    Precomputes, for every square of a packed board, the indices reached
+    by walking away from it in each direction. Rays shorter than two
+    squares are left out, since they can never flip anything.
+
+    Args:
+        side: number of squares on each side of the board
+
+    Returns: a tuple, indexed by square, of tuples of rays
+    """
+    table = []
+    for row in range(side):
+        for col in range(side):
+            rays = []
+            for dr, dc in DIRECTIONS:
+                ray = []
+                r, c = row + dr, col + dc
+                while 0 <= r < side and 0 <= c < side:
+                    ray.append(r * side + c)
+                    r += dr
+                    c += dc
+                if len(ray) >= 2:
+                    rays.append(tuple(ray))
+            table.append(tuple(rays))
+    return tuple(table)
+
+
+@functools.lru_cache(maxsize=None)
+def _center_indices(side: int, players: int) -> Tuple[int, ...]:
+    """
+    Returns the packed indices of center_squares(side, players)
+    """
+    return tuple(r * side + c for r, c in center_squares(side, players))
+
+
+def flipped_by(board: Any, rays: Tuple[Tuple[int, ...], ...],
+           player: int) -> List[int]:
+    """
+    Finds the pieces flipped by placing a piece of the given player on
+    a packed board
+
+    Args:
+        board: packed board (0 for an empty square)
+        rays: the rays of the square where the piece is placed
+        player: the player placing the piece
+
+    Returns: the packed indices of the flipped pieces (empty if the
+        move would not flip anything)
+    """
+    flips: List[int] = []
+    for ray in rays:
+        if board[ray[0]] in (0, player):
+            continue
+        for n, idx in enumerate(ray):
+            owner = board[idx]
+            if owner == 0:
+                break
+            if owner == player:
+                flips.extend(ray[:n])
+                break
+    return flips
+
+
+def _moves_with_flips(board: Any, side: int, players: int, othello: bool,
+                      num_moves: int, player: int
+                      ) -> List[Tuple[int, List[int]]]:
+    """
+    Generates every legal move of a player on a packed board, together
+    with the pieces it flips, in row-major order
+
+    Args:
+        board: packed board (0 for an empty square)
+        side: number of squares on each side of the board
+        players: number of players
+        othello: whether the game started with an Othello configuration
+        num_moves: the move counter of the game
+        player: the player to move
+
+    Returns: a list of (packed index, flipped indices) pairs
+    """
+    if num_moves < players ** 2 and not othello:
+        return [(idx, []) for idx in sorted(_center_indices(side, players))
+                if board[idx] == 0]
+    rays = rays_table(side)
+    moves = []
+    for idx, owner in enumerate(board):
+        if owner == 0:
+            flips = flipped_by(board, rays[idx], player)
+            if flips:
+                moves.append((idx, flips))
+    return moves
+
+
+def _has_move(board: Any, side: int, players: int, othello: bool,
+              num_moves: int, player: int) -> bool:
+    """
+    Returns True if the player has at least one legal move on the
+    packed board (see _moves_with_flips for the arguments)
+    """
+    if num_moves < players ** 2 and not othello:
+        return any(board[idx] == 0 for idx in _center_indices(side, players))
+    rays = rays_table(side)
+    for idx, owner in enumerate(board):
+        if owner == 0 and flipped_by(board, rays[idx], player):
+            return True
+    return False
+
+
+class GameState(NamedTuple):
+    """
+    Immutable, hashable snapshot of a game of Reversi.
+
+    Unlike Reversi, no operation on a GameState modifies it, so the same
+    state can be shared between threads and sent to other processes.
+    Use legal_moves and play to explore the game from a state.
+
+    Attributes:
+        side: number of squares on each side of the board
+        players: number of players
+        othello: whether the game started with an Othello configuration
+        board: the packed board, row by row, with 0 for empty squares
+        turn: the player who must make the next move
+        num_moves: the move counter, which decides when the opening
+            (center squares only) phase of a non-Othello game is over
+        counters: the number of pieces of each player (index player - 1)
+    """
+    side: int
+    players: int
+    othello: bool
+    board: Tuple[int, ...]
+    turn: int
+    num_moves: int
+    counters: Tuple[int, ...]
+
+    @classmethod
+    def from_reversi(cls, game: "Reversi") -> "GameState":
+        """
+        Takes a snapshot of a Reversi game
+
+        Args:
+            game: the game
+
+        Returns: the GameState of the game
+        """
+        board = tuple(0 if piece is None else piece
+                      for row in game.grid for piece in row)
+        counters = [0] * game.num_players
+        for piece in board:
+            if piece:
+                counters[piece - 1] += 1
+        return cls(game.size, game.num_players, game._othello, board,
+                   game.turn, game._num_moves, tuple(counters))
+
+    def to_reversi(self) -> "Reversi":
+        """
+        Creates a new Reversi game in this state
+
+        Returns: the new game
+        """
+        rev = Reversi(self.side, self.players, self.othello)
+        rev._restore(self.board, self.turn, self.num_moves)
+        return rev
+
+    @property
+    def empties(self) -> int:
+        """
+        Returns the number of empty squares
+        """
+        return self.side * self.side - sum(self.counters)
+
+
+def legal_moves(state: GameState) -> ListMovesType:
+    """
+    Lists the moves the player to move can make, in the same order as
+    Reversi.available_moves
+
+    Args:
+        state: the game state
+
+    Returns: the list of positions where a piece can be placed
+    """
+    side = state.side
+    return [divmod(idx, side) for idx, _ in
+            _moves_with_flips(state.board, side, state.players,
+                              state.othello, state.num_moves, state.turn)]
+
+
+def is_done(state: GameState) -> bool:
+    """
+    Returns True if no player can make a move in the given state
+    """
+    for player in range(1, state.players + 1):
+        if _has_move(state.board, state.side, state.players, state.othello,
+                     state.num_moves, player):
+            return False
+    return True
+
+
+def winners(state: GameState) -> List[int]:
+    """
+    Returns the players with the most pieces in the given state. The
+    state is not required to be finished.
+    """
+    best = max(state.counters)
+    return [player for player, count in enumerate(state.counters, 1)
+            if count == best]
+
+
+def play(state: GameState, move: Tuple[int, int]) -> GameState:
+    """
+    Applies a move to a game state, following the same rules as
+    Reversi.apply_move (including how the turn skips over players
+    without moves).
+
+    Args:
+        state: the game state
+        move: position where the player to move places a piece
+
+    Raises:
+        ValueError:
+        - If the position is outside the bounds of the board.
+        - If the move is not legal
+
+    Returns: the new game state (the given state is left unchanged)
+    """
+    row, col = move
+    side = state.side
+    if not 0 <= row < side or not 0 <= col < side:
+        raise ValueError("the specified position is outside the bounds of \
+            the board")
+    idx = row * side + col
+    board = state.board
+    player = state.turn
+    players = state.players
+    if board[idx] != 0:
+        raise ValueError("move is not legal")
+    if state.num_moves < players ** 2 and not state.othello:
+        if idx not in _center_indices(side, players):
+            raise ValueError("move is not legal")
+        flips: List[int] = []
+    else:
+        flips = flipped_by(board, rays_table(side)[idx], player)
+        if not flips:
+            raise ValueError("move is not legal")
+
+    new_board = list(board)
+    counters = list(state.counters)
+    for flip in flips:
+        counters[new_board[flip] - 1] -= 1
+        new_board[flip] = player
+    new_board[idx] = player
+    counters[player - 1] += len(flips) + 1
+
+    turn = player
+    num_moves = state.num_moves
+    for _ in range(players):
+        turn = turn % players + 1
+        num_moves += 1
+        if _has_move(new_board, side, players, state.othello, num_moves,
+                     turn):
+            break
+    return GameState(side, players, state.othello, tuple(new_board), turn,
+                     num_moves, tuple(counters))
+
+
+def random_playout(game: Any, rng: Any) -> Tuple[List[int], List[int]]:
+    """
+    Plays a game to the end with uniformly random moves, following the
+    same rules as Reversi.apply_move. The moves are made on a private
+    packed copy of the board, so the game itself is left unchanged.
+
+    Args:
+        game: the game (a Reversi or a GameState) to start from
+        rng: the random number generator to use (such as random.Random)
+
+    Returns: the final number of pieces of each player (index player - 1)
+        and the list of winners
+    """
+    state = game
+    if isinstance(game, Reversi):
+        state = GameState.from_reversi(game)
+    side, players, othello = state.side, state.players, state.othello
+    board = list(state.board)
+    counters = list(state.counters)
+    rays = rays_table(side)
+    centers = sorted(_center_indices(side, players))
+    empties = [idx for idx, owner in enumerate(board) if owner == 0]
+    turn = state.turn
+    num_moves = state.num_moves
+    passes = 0
+    while passes < players:
+        if num_moves < players ** 2 and not othello:
+            moves = [(idx, ()) for idx in centers if board[idx] == 0]
+        else:
+            moves = []
+            for idx in empties:
+                flips = flipped_by(board, rays[idx], turn)
+                if flips:
+                    moves.append((idx, flips))
+        if moves:
+            passes = 0
+            idx, flips = moves[rng.randrange(len(moves))]
+            for flip in flips:
+                counters[board[flip] - 1] -= 1
+                board[flip] = turn
+            board[idx] = turn
+            empties.remove(idx)
+            counters[turn - 1] += len(flips) + 1
+        else:
+            passes += 1
+        turn = turn % players + 1
+        num_moves += 1
+    best = max(counters)
+    return counters, [player for player, count in enumerate(counters, 1)
+                      if count == best]
+
+
+#
+# INSTRUMENTATION
+#
+
+INSTRUMENTED_METHODS = ["legal_move", "can_move", "available_moves",
+                        "apply_move", "done", "load_game", "simulate_moves"]
+"""
+Names of the Reversi methods and properties that can be instrumented.
+"""
+
+_originals: Dict[str, Any] = {}
+_counters: Dict[str, List[float]] = {name: [0, 0.0]
+                                     for name in INSTRUMENTED_METHODS}
+
+
+def _timed(name: str, func: Callable) -> Callable:
+    """
+    Wraps a function so that every call is counted and timed
+
+    Args:
+        name: the key under which the call is recorded
+        func: the function to wrap
+
+    Returns: the wrapped function
+    """
+    record = _counters[name]
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record[0] += 1
+            record[1] += time.perf_counter() - start
+    return wrapper
+
+
+def enable_instrumentation() -> None:
+    """
+    Starts counting calls and accumulated time of the methods listed in
+    INSTRUMENTED_METHODS, for every Reversi instance.
+
+    The methods are swapped for timed wrappers on the class itself, so
+    when instrumentation is off the original, unwrapped methods run.
+    Times are inclusive: available_moves also accounts for the
+    legal_move calls it makes.
+
+    Returns: None
+    """
+    if _originals:
+        return
+    for name in INSTRUMENTED_METHODS:
+        attr = Reversi.__dict__[name]
+        _originals[name] = attr
+        if isinstance(attr, property):
+            setattr(Reversi, name, property(_timed(name, attr.fget),
+                                            doc=attr.__doc__))
+        else:
+            setattr(Reversi, name, _timed(name, attr))
+
+
+def disable_instrumentation() -> None:
+    """
+    Restores the uninstrumented methods. Accumulated statistics are kept
+    until reset_stats is called.
+
+    Returns: None
+    """
+    for name, attr in _originals.items():
+        setattr(Reversi, name, attr)
+    _originals.clear()
+
+
+def instrumentation_enabled() -> bool:
+    """
+    Returns True if the Reversi methods are currently instrumented
+    """
+    return bool(_originals)
+
+
+def stats() -> Dict[str, Tuple[int, float]]:
+    """
+    Returns a snapshot of the instrumentation counters, mapping each
+    method name to a (number of calls, accumulated seconds) pair.
+    """
+    return {name: (int(calls), secs)
+            for name, (calls, secs) in _counters.items()}
+
+
+def reset_stats() -> None:
+    """
+    Sets every instrumentation counter back to zero
+
+    Returns: None
+    """
+    for record in _counters.values():
+        record[0] = 0
+        record[1] = 0.0
+
+
+#
+# MOVE CACHE
+#
+
+MoveList = Tuple[Tuple[Tuple[int, int], Tuple[Tuple[int, int], ...]], ...]
+"""
+Type of a move cache entry: (move, flipped positions) pairs.
+"""
+
+
+class MoveCache:
+    """
+    Size-bounded, least-recently-used cache of the legal moves of
+    positions, shared by every Reversi instance.
+
+    Positions are keyed by packed board, player to move, number of
+    players and whether the game is still in its opening (center squares
+    only) phase, which together determine the legal moves.
+    """
+
+    def __init__(self, maxsize: int):
+        """
+        Constructor
+
+        Args:
+            maxsize: the largest number of positions kept
+
+        Raises:
+            ValueError: If maxsize is not positive
+        """
+        if maxsize < 1:
+            raise ValueError("the move cache needs room for a position")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Any, MoveList]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Any) -> Optional[MoveList]:
+        """
+        Looks up a position, counting a hit or a miss
+
+        Returns: the cached entry, or None if the position is not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Any, entry: MoveList) -> None:
+        """
+        Stores a position, evicting the least recently used one if the
+        cache is full
+
+        Returns: None
+        """
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Removes every position and sets the counters back to zero
+
+        Returns: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_move_cache: Optional[MoveCache] = None
+
+
+def enable_move_cache(maxsize: int = 4096) -> MoveCache:
+    """
+    Makes available_moves (and so done and the end of apply_move) and
+    move_flips of every Reversi instance consult a move cache first.
+    A cache that is already enabled is kept if it has the same size.
+
+    Args:
+        maxsize: the largest number of positions kept
+
+    Returns: the cache
+    """
+    global _move_cache
+    if _move_cache is None or _move_cache.maxsize != maxsize:
+        _move_cache = MoveCache(maxsize)
+    return _move_cache
+
+
+def disable_move_cache() -> None:
+    """
+    Drops the move cache, so legal moves are computed from the board on
+    every query again
+
+    Returns: None
+    """
+    global _move_cache
+    _move_cache = None
+
+
+def move_cache_stats() -> Tuple[int, int, int]:
+    """
+    Returns the number of hits, misses and cached positions of the move
+    cache (all zero if it is not enabled)
+    """
+    if _move_cache is None:
+        return (0, 0, 0)
+    return (_move_cache.hits, _move_cache.misses, len(_move_cache))
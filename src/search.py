@@ -0,0 +1,532 @@
+"""
+Game tree search for Reversi bots.
+
+Searches work on immutable GameState snapshots, so they never modify
+the Reversi game they are asked about. Two-player games are searched
+with negamax alpha-beta, games with more players with max^n. Both
+use iterative deepening, and try the best move of the previous
+iteration first at every node.
+
+ParallelSearcher spreads the root moves of a search over worker
+processes, Young Brothers Wait style: the first move is searched alone,
+then the others are searched in parallel with the best score so far
+shared through shared memory as the alpha bound. Workers keep reading
+that bound while they search, and narrow their window when a sibling
+raises it.
+"""
+import multiprocessing
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import (Any, Callable, Dict, List, NamedTuple, Optional, Tuple,
+                    Union)
+
+from reversi import (Reversi, GameState, ListMovesType, legal_moves, play,
+                     winners)
+from endgame import EndgameSolver, SolveAborted
+
+Evaluation = Callable[[GameState, int], float]
+"""
+Type for evaluation functions. An evaluation function takes a game state
+and a player number, and returns how good the state is for that player
+(higher is better).
+"""
+
+WIN_SCORE = 100000.0
+"""
+Score given to a finished game for a winner (plus the disc difference),
+so that any win is preferred over any evaluation.
+"""
+
+
+def disc_difference(state: GameState, player: int) -> float:
+    """
+    Evaluates a state as the number of pieces of the player minus the
+    number of pieces of the strongest opponent
+
+    Args:
+        state: the game state
+        player: the player to evaluate for
+
+    Returns: the evaluation
+    """
+    own = state.counters[player - 1]
+    others = [count for p, count in enumerate(state.counters, 1)
+              if p != player]
+    return float(own - max(others))
+
+
+def final_score(state: GameState, player: int) -> float:
+    """
+    Scores a finished game for a player: WIN_SCORE plus the disc
+    difference for an outright win, 0 for a shared win (a draw in a
+    two-player game, so that scores stay zero-sum for negamax) and minus
+    WIN_SCORE plus the disc difference for a loss
+
+    Args:
+        state: the finished game state
+        player: the player to score for
+
+    Returns: the score
+    """
+    diff = disc_difference(state, player)
+    best = winners(state)
+    if player not in best:
+        return -WIN_SCORE + diff
+    if len(best) > 1:
+        return 0.0
+    return WIN_SCORE + diff
+
+
+class SearchResult(NamedTuple):
+    """
+    Result of a search.
+
+    Attributes:
+        move: the best move found (None if there are no legal moves)
+        score: the score of the move for the player to move
+        depth: the depth of the deepest completed iteration
+        nodes: the number of positions visited
+        pv: the principal variation, starting with move
+    """
+    move: Optional[Tuple[int, int]]
+    score: float
+    depth: int
+    nodes: int
+    pv: ListMovesType
+
+
+class SearchAborted(Exception):
+    """
+    Raised inside a search when its node or time budget runs out
+    """
+
+
+class WindowRaised(Exception):
+    """
+    Raised inside the search of a root move when another worker has
+    raised the shared alpha bound, so that the move is searched again
+    with the narrower window
+    """
+
+
+class Searcher:
+    """
+    Iterative-deepening alpha-beta (two players) or max^n (more players)
+    search with a pluggable evaluation function.
+
+    The best move found at every visited position is remembered across
+    iterations and across calls to search, and is tried first. A search
+    of the next position after a move therefore starts from the work
+    done on it by earlier searches (including searches run while
+    pondering on the opponent's time).
+    """
+
+    CHECK_EVERY = 16
+    """
+    Number of nodes between two checks of the clock. A node costs a scan
+    of the board for legal moves, which dwarfs reading the clock, so the
+    interval is kept small enough to hold deadlines on large boards.
+    """
+
+    MAX_REMEMBERED = 1000000
+    """
+    Number of remembered best moves above which they are forgotten at
+    the start of the next search.
+    """
+
+    def __init__(self, evaluate: Evaluation = disc_difference,
+                 max_depth: int = 64, node_limit: Optional[int] = None,
+                 time_limit: Optional[float] = None,
+                 endgame: Optional[EndgameSolver] = None):
+        """
+        Constructor
+
+        Args:
+            evaluate: evaluation function used at the leaves
+            max_depth: the deepest iteration to run
+            node_limit: maximum number of nodes per search (or None)
+            time_limit: maximum number of seconds per search (or None)
+            endgame: solver used instead of the search for positions
+                it can solve (or None)
+        """
+        self.evaluate = evaluate
+        self.max_depth = max_depth
+        self.node_limit = node_limit
+        self.time_limit = time_limit
+        self.endgame = endgame
+        self.best_moves: Dict[GameState, Tuple[int, int]] = {}
+        self.nodes = 0
+        self._deadline: Optional[float] = None
+        self._stop: Optional[threading.Event] = None
+        self._window_raised: Optional[Callable[[], bool]] = None
+
+    def search(self, game: Union[Reversi, GameState],
+               stop: Optional[threading.Event] = None) -> SearchResult:
+        """
+        Searches for the best move of the player to move
+
+        Args:
+            game: the game (or game state) to search
+            stop: an event that ends the search when it is set (or None)
+
+        Returns: the result of the deepest completed iteration. If not
+            even the first iteration completes within the budget, the
+            first move in search order is returned.
+        """
+        if isinstance(game, Reversi):
+            state = GameState.from_reversi(game)
+        else:
+            state = game
+        moves = legal_moves(state)
+        if len(self.best_moves) > self.MAX_REMEMBERED:
+            self.best_moves.clear()
+        self.nodes = 0
+        self._deadline = None
+        self._stop = stop
+        if self.time_limit is not None:
+            self._deadline = time.monotonic() + self.time_limit
+        if not moves:
+            return SearchResult(None, final_score(state, state.turn), 0, 0,
+                                [])
+        if self.endgame is not None and self.endgame.can_solve(state):
+            try:
+                return self._solve(state)
+            except SolveAborted:
+                pass
+
+        best = SearchResult(self._order(state, moves)[0], 0.0, 0, 0, [])
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score = self._root(state, depth)
+            except SearchAborted:
+                break
+            move = self.best_moves[state]
+            best = SearchResult(move, score, depth, self.nodes,
+                                self.principal_variation(state, depth))
+            if abs(score) >= WIN_SCORE or len(moves) == 1:
+                break
+        return best._replace(nodes=self.nodes)
+
+    def _solve(self, state: GameState) -> SearchResult:
+        """
+        Solves the position with the endgame solver, within the time
+        left for the search and until the search is stopped
+
+        Raises:
+            SolveAborted: If the solver runs out of time or is stopped
+        """
+        time_left = None
+        if self._deadline is not None:
+            time_left = self._deadline - time.monotonic()
+        solved = self.endgame.solve(state, time_left, self._stop)
+        if solved.score > 0:
+            score = WIN_SCORE + solved.score
+        elif solved.score < 0:
+            score = -WIN_SCORE + solved.score
+        else:
+            score = 0.0
+        self.nodes = solved.nodes
+        return SearchResult(solved.move, score, state.empties, solved.nodes,
+                            [solved.move])
+
+    def principal_variation(self, state: GameState,
+                            depth: int) -> ListMovesType:
+        """
+        Follows the remembered best moves from a state
+
+        Args:
+            state: the state to start from
+            depth: maximum number of moves to follow
+
+        Returns: the list of moves
+        """
+        pv = []
+        while len(pv) < depth and state in self.best_moves:
+            move = self.best_moves[state]
+            pv.append(move)
+            state = play(state, move)
+        return pv
+
+    def _order(self, state: GameState,
+               moves: ListMovesType) -> ListMovesType:
+        """
+        Puts the remembered best move of a state first
+        """
+        best = self.best_moves.get(state)
+        if best is not None and best in moves:
+            moves = [best] + [move for move in moves if move != best]
+        return moves
+
+    def _visit(self) -> None:
+        """
+        Counts a node and checks the budget
+
+        Raises:
+            SearchAborted: If the budget has run out or the search is
+                stopped
+            WindowRaised: If the shared alpha bound of a parallel search
+                has been raised
+        """
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchAborted
+        if self.nodes % self.CHECK_EVERY == 0:
+            if (self._deadline is not None
+                    and time.monotonic() > self._deadline):
+                raise SearchAborted
+            if self._stop is not None and self._stop.is_set():
+                raise SearchAborted
+            if self._window_raised is not None and self._window_raised():
+                raise WindowRaised
+
+    def _root(self, state: GameState, depth: int) -> float:
+        """
+        Runs one iteration from the root
+
+        Returns: the score of the root for the player to move
+        """
+        if state.players == 2:
+            return self._negamax(state, depth, -float("inf"), float("inf"))
+        return self._maxn(state, depth)[state.turn - 1]
+
+    def _negamax(self, state: GameState, depth: int, alpha: float,
+                 beta: float) -> float:
+        """
+        Negamax alpha-beta for two players
+
+        Returns: the score of the state for the player to move
+        """
+        self._visit()
+        moves = legal_moves(state)
+        if not moves:
+            return final_score(state, state.turn)
+        if depth == 0:
+            return self.evaluate(state, state.turn)
+
+        best_score = -float("inf")
+        best_move = moves[0]
+        for move in self._order(state, moves):
+            child = play(state, move)
+            if child.turn == state.turn:
+                score = self._negamax(child, depth - 1, alpha, beta)
+            else:
+                score = -self._negamax(child, depth - 1, -beta, -alpha)
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        self.best_moves[state] = best_move
+        return best_score
+
+    def _maxn(self, state: GameState, depth: int) -> List[float]:
+        """
+        Max^n search for more than two players
+
+        Returns: the scores of the state for every player
+            (index player - 1)
+        """
+        self._visit()
+        moves = legal_moves(state)
+        players = range(1, state.players + 1)
+        if not moves:
+            return [final_score(state, p) for p in players]
+        if depth == 0:
+            return [self.evaluate(state, p) for p in players]
+
+        me = state.turn - 1
+        best_scores: List[float] = []
+        best_move = moves[0]
+        for move in self._order(state, moves):
+            scores = self._maxn(play(state, move), depth - 1)
+            if not best_scores or scores[me] > best_scores[me]:
+                best_scores = scores
+                best_move = move
+        self.best_moves[state] = best_move
+        return best_scores
+
+
+_worker_searcher: Optional[Searcher] = None
+_worker_alpha: Optional[SharedMemory] = None
+_worker_lock: Any = None
+
+
+def _init_worker(alpha_name: str, lock: Any) -> None:
+    """
+    Sets up a worker process of a ParallelSearcher
+    """
+    global _worker_alpha, _worker_lock
+    _worker_alpha = SharedMemory(name=alpha_name)
+    _worker_lock = lock
+
+
+def _shared_alpha() -> float:
+    """
+    Reads the alpha bound shared by the workers
+    """
+    return struct.unpack_from("d", _worker_alpha.buf)[0]
+
+
+def _search_root_move(state: GameState, move: Tuple[int, int], depth: int,
+                      evaluate: Evaluation, deadline: Optional[float]
+                      ) -> Tuple[Tuple[int, int], Optional[float], int]:
+    """
+    Searches one root move in a worker process, with the alpha bound in
+    shared memory, and publishes its score if it raises the bound. When
+    another worker raises the bound during the search, the move is
+    searched again with the narrower window.
+
+    Args:
+        deadline: the time.monotonic() time at which the search of the
+            whole root ends (or None)
+
+    Returns: the move, its score for the player to move at the root
+        (None if the time limit ran out) and the number of nodes
+    """
+    global _worker_searcher
+    if _worker_searcher is None or _worker_searcher.evaluate is not evaluate:
+        _worker_searcher = Searcher(evaluate)
+    searcher = _worker_searcher
+    if len(searcher.best_moves) > searcher.MAX_REMEMBERED:
+        searcher.best_moves.clear()
+    searcher.nodes = 0
+    searcher._deadline = deadline
+    if deadline is not None and time.monotonic() >= deadline:
+        return move, None, 0
+
+    child = play(state, move)
+    try:
+        while True:
+            alpha = _shared_alpha()
+            if state.players == 2:
+                searcher._window_raised = lambda: _shared_alpha() > alpha
+            try:
+                if state.players != 2:
+                    score = searcher._maxn(child, depth - 1)[state.turn - 1]
+                elif child.turn == state.turn:
+                    score = searcher._negamax(child, depth - 1, alpha,
+                                              float("inf"))
+                else:
+                    score = -searcher._negamax(child, depth - 1,
+                                               -float("inf"), -alpha)
+                break
+            except WindowRaised:
+                continue
+    except SearchAborted:
+        return move, None, searcher.nodes
+    finally:
+        searcher._window_raised = None
+    with _worker_lock:
+        if score > struct.unpack_from("d", _worker_alpha.buf)[0]:
+            struct.pack_into("d", _worker_alpha.buf, 0, score)
+    return move, score, searcher.nodes
+
+
+class ParallelSearcher:
+    """
+    Iterative-deepening search whose root moves are split across worker
+    processes. The evaluation function must be a module-level function,
+    so that it can be sent to the workers.
+    """
+
+    def __init__(self, workers: Optional[int] = None,
+                 evaluate: Evaluation = disc_difference,
+                 max_depth: int = 6, time_limit: Optional[float] = None):
+        """
+        Constructor
+
+        Args:
+            workers: number of worker processes (the number of CPUs if
+                None)
+            evaluate: evaluation function used at the leaves
+            max_depth: the deepest iteration to run
+            time_limit: maximum number of seconds per search (or None)
+        """
+        self.evaluate = evaluate
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.searcher = Searcher(evaluate)
+        self._alpha = SharedMemory(create=True, size=8)
+        self._lock = multiprocessing.Lock()
+        self.executor = ProcessPoolExecutor(
+            workers, initializer=_init_worker,
+            initargs=(self._alpha.name, self._lock))
+
+    def search(self, game: Union[Reversi, GameState]) -> SearchResult:
+        """
+        Searches for the best move of the player to move
+
+        Args:
+            game: the game (or game state) to search
+
+        Returns: the result of the deepest completed iteration
+        """
+        if isinstance(game, Reversi):
+            state = GameState.from_reversi(game)
+        else:
+            state = game
+        moves = legal_moves(state)
+        if not moves:
+            return SearchResult(None, final_score(state, state.turn), 0, 0,
+                                [])
+        deadline = None
+        if self.time_limit is not None:
+            deadline = time.monotonic() + self.time_limit
+
+        nodes = 0
+        best = SearchResult(moves[0], 0.0, 0, 0, [])
+        for depth in range(1, self.max_depth + 1):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            ordered = self.searcher._order(state, moves)
+            first, score, count = self._first(state, ordered[0], depth,
+                                              deadline)
+            nodes += count
+            if score is None:
+                break
+            struct.pack_into("d", self._alpha.buf, 0, score)
+            futures = [self.executor.submit(_search_root_move, state, move,
+                                            depth, self.evaluate, deadline)
+                       for move in ordered[1:]]
+            best_move, best_score = first, score
+            complete = True
+            for future in futures:
+                move, score, count = future.result()
+                nodes += count
+                if score is None:
+                    complete = False
+                elif score > best_score:
+                    best_move, best_score = move, score
+            if not complete:
+                break
+            self.searcher.best_moves[state] = best_move
+            best = SearchResult(best_move, best_score, depth, nodes,
+                                self.searcher.principal_variation(state, 1))
+            if abs(best_score) >= WIN_SCORE or len(moves) == 1:
+                break
+        return best._replace(nodes=nodes)
+
+    def _first(self, state: GameState, move: Tuple[int, int], depth: int,
+               deadline: Optional[float]
+               ) -> Tuple[Tuple[int, int], Optional[float], int]:
+        """
+        Searches the first root move with a full window
+        """
+        struct.pack_into("d", self._alpha.buf, 0, -float("inf"))
+        return self.executor.submit(_search_root_move, state, move, depth,
+                                    self.evaluate, deadline).result()
+
+    def close(self) -> None:
+        """
+        Stops the worker processes and frees the shared memory
+
+        Returns: None
+        """
+        self.executor.shutdown()
+        self._alpha.close()
+        self._alpha.unlink()
@@ -0,0 +1,265 @@
+"""
+Self-play datasets.
+
+run_selfplay plays games between bots across worker processes (through
+tournament.play_game, so games are seeded and can be replayed) and
+writes every position of every game to binary shard files, one shard per
+chunk of games, written by the worker that played them.
+
+A shard is a header followed by fixed-size records, one per position:
+the packed board (one byte per square, 0 for empty), the player to
+move, the packed index of the move played and the winners of the game
+as a bit mask (bit player - 1). Records have a fixed size, so a shard
+is read by mapping it into memory and indexing it directly: Dataset
+gives random access to the positions of many shards, and shuffled
+batches of them.
+"""
+import bisect
+import mmap
+import os
+import random
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from reversi import GameState, Reversi, play
+from tournament import BotFactory, play_game, seatings, derive_seed
+
+MAGIC = b"RVSP"
+HEADER = struct.Struct("<4sHBB")
+"""
+Shard header: magic, format version, board size and number of players.
+"""
+VERSION = 1
+
+
+def record_struct(side: int) -> struct.Struct:
+    """
+    Returns the record format of a board size: packed board, player to
+    move, packed index of the move and winner bit mask
+    """
+    return struct.Struct(f"<{side * side}sBHH")
+
+
+class Position(NamedTuple):
+    """
+    Position of a self-play game.
+
+    Attributes:
+        board: the packed board (0 for empty squares)
+        turn: the player to move
+        move: the move played
+        winners: the winners of the game
+    """
+    board: Tuple[int, ...]
+    turn: int
+    move: Tuple[int, int]
+    winners: List[int]
+
+
+def game_records(side: int, players: int, othello: bool,
+                 moves: Sequence[Sequence[int]],
+                 winners: Sequence[int]) -> bytes:
+    """
+    Encodes the positions of a game as shard records
+
+    Args:
+        side: board size
+        players: number of players
+        othello: whether the game started with an Othello configuration
+        moves: the moves of the game
+        winners: the winners of the game
+
+    Returns: the records, one per move
+    """
+    record = record_struct(side)
+    mask = sum(1 << (player - 1) for player in winners)
+    state = GameState.from_reversi(Reversi(side, players, othello))
+    data = bytearray()
+    for row, col in moves:
+        data += record.pack(bytes(state.board), state.turn, row * side + col,
+                            mask)
+        state = play(state, (row, col))
+    return bytes(data)
+
+
+def _play_shard(factories: Sequence[BotFactory], path: str,
+                jobs: List[Tuple[Tuple[int, ...], int]], side: int,
+                players: int, othello: bool,
+                deadline_ms: Optional[int]) -> int:
+    """
+    Plays a chunk of games in a worker process and writes their
+    positions to a shard
+
+    Returns: the number of positions written
+    """
+    count = 0
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, side, players))
+        for seating, seed in jobs:
+            result = play_game(factories, seating, side, players, othello,
+                               deadline_ms, seed)
+            f.write(game_records(side, players, othello, result["moves"],
+                                 result["winners"]))
+            count += len(result["moves"])
+    return count
+
+
+def run_selfplay(factories: Sequence[BotFactory], num_games: int,
+                 out_dir: str, side: int = 8, players: int = 2,
+                 othello: bool = True, workers: Optional[int] = None,
+                 games_per_shard: int = 100,
+                 deadline_ms: Optional[int] = None,
+                 seed: Optional[int] = None) -> List[str]:
+    """
+    Plays self-play games and writes their positions to shards
+
+    Args:
+        factories: the bot factories (seated in turn, like in
+            tournament.run_tournament; a single factory plays itself)
+        num_games: number of games to play
+        out_dir: the directory of the shards (created if needed)
+        side: board size
+        players: number of players
+        othello: whether games start with an Othello configuration
+        workers: number of worker processes (the number of CPUs if None)
+        games_per_shard: number of games written to each shard
+        deadline_ms: time each bot may take for a move (or None)
+        seed: master seed from which the seeds of the games are derived
+            (random if None)
+
+    Returns: the paths of the shards
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if seed is None:
+        seed = random.getrandbits(64)
+    seats = seatings(len(factories), players)
+    jobs = [(seats[game_id % len(seats)], derive_seed(seed, game_id))
+            for game_id in range(num_games)]
+    paths = []
+    with ProcessPoolExecutor(workers) as executor:
+        futures = []
+        for i in range(0, num_games, games_per_shard):
+            path = os.path.join(out_dir,
+                                f"shard-{i // games_per_shard:05d}.bin")
+            paths.append(path)
+            futures.append(executor.submit(_play_shard, list(factories),
+                                           path, jobs[i:i + games_per_shard],
+                                           side, players, othello,
+                                           deadline_ms))
+        for future in futures:
+            future.result()
+    return paths
+
+
+class Shard:
+    """
+    Read-only, memory-mapped shard
+    """
+
+    def __init__(self, path: str):
+        """
+        Constructor
+
+        Args:
+            path: the shard file
+
+        Raises:
+            ValueError: If the file is not a shard
+        """
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, side, players = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a self-play shard")
+        self.side = side
+        self.players = players
+        self.record = record_struct(side)
+        self.count = (len(self._map) - HEADER.size) // self.record.size
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> Position:
+        if not 0 <= i < self.count:
+            raise IndexError("position index out of range")
+        board, turn, idx, mask = self.record.unpack_from(
+            self._map, HEADER.size + i * self.record.size)
+        return Position(tuple(board), turn, divmod(idx, self.side),
+                        [p for p in range(1, self.players + 1)
+                         if mask >> (p - 1) & 1])
+
+    def close(self) -> None:
+        """
+        Unmaps the shard
+
+        Returns: None
+        """
+        self._map.close()
+
+
+class Dataset:
+    """
+    Positions of many shards, with random access and shuffled batches
+    """
+
+    def __init__(self, paths: Sequence[str]):
+        """
+        Constructor
+
+        Args:
+            paths: the shard files
+        """
+        self.shards = [Shard(path) for path in paths]
+        self._starts = []
+        total = 0
+        for shard in self.shards:
+            self._starts.append(total)
+            total += len(shard)
+        self.count = total
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self) -> "Dataset":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __getitem__(self, i: int) -> Position:
+        if not 0 <= i < self.count:
+            raise IndexError("position index out of range")
+        shard = bisect.bisect_right(self._starts, i) - 1
+        return self.shards[shard][i - self._starts[shard]]
+
+    def batches(self, batch_size: int,
+                rng: Optional[random.Random] = None,
+                shuffle: bool = True) -> Iterator[List[Position]]:
+        """
+        Goes once through the positions, in batches
+
+        Args:
+            batch_size: number of positions of each batch (the last one
+                may be smaller)
+            rng: the random number generator used to shuffle (a new one
+                if None)
+            shuffle: whether to go through the positions in random order
+
+        Returns: an iterator over the batches
+        """
+        order = list(range(self.count))
+        if shuffle:
+            (rng if rng is not None else random.Random()).shuffle(order)
+        for i in range(0, self.count, batch_size):
+            yield [self[j] for j in order[i:i + batch_size]]
+
+    def close(self) -> None:
+        """
+        Unmaps the shards
+
+        Returns: None
+        """
+        for shard in self.shards:
+            shard.close()
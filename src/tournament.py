@@ -0,0 +1,440 @@
+"""
+Bot tournaments played across worker processes.
+
+Games are handed out to a process pool in chunks. Every finished game is
+written as one JSON line as soon as its chunk comes back, and rolling
+win/draw/loss rates are reported along the way.
+
+Bots are given as factories: any picklable callable that takes a player
+number and an rng keyword argument, and returns a bot (usually a bot
+class, or a functools.partial of one with extra arguments).
+
+Every game gets its own seed, derived from the master seed of the
+tournament and the game number, and every seat of a game its own random
+number generator derived from the game seed. Results do not depend on
+which worker plays a game, and the seed written with each result is
+enough to replay it (as long as the bots do not stop on a clock).
+"""
+import itertools
+import json
+import math
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import (Any, Callable, Dict, IO, List, NamedTuple, Optional,
+                    Sequence, Tuple)
+
+from reversi import Reversi
+
+BotFactory = Callable[[int], Any]
+"""
+Type for bot factories: called with a player number (and an rng keyword
+argument), returns a bot.
+"""
+
+Z_95 = 1.96
+"""
+Normal quantile of a two-sided 95% confidence interval.
+"""
+
+
+def bot_name(factory: BotFactory) -> str:
+    """
+    Returns a readable name for a bot factory
+    """
+    func = getattr(factory, "func", factory)
+    return getattr(func, "__name__", repr(factory))
+
+
+def derive_seed(seed: int, *path: int) -> int:
+    """
+    Derives an independent seed from a seed and a path of numbers (such
+    as a game number and a seat)
+
+    Args:
+        seed: the seed to derive from
+        path: the numbers identifying the derived stream
+
+    Returns: a 64-bit seed
+    """
+    key = ":".join(str(n) for n in (seed,) + path)
+    return random.Random(key).getrandbits(64)
+
+
+def seatings(num_bots: int, players: int) -> List[Tuple[int, ...]]:
+    """
+    Lists the ways of seating bots at a game, so that every bot plays
+    every seat equally often
+
+    Args:
+        num_bots: number of bots in the tournament
+        players: number of players of each game
+
+    Returns: a list of tuples giving the bot (index) of each seat
+    """
+    if num_bots >= players:
+        return list(itertools.permutations(range(num_bots), players))
+    return [tuple((seat + shift) % num_bots for seat in range(players))
+            for shift in range(num_bots)]
+
+
+def play_game(factories: Sequence[BotFactory], seating: Tuple[int, ...],
+              side: int, players: int, othello: bool,
+              deadline_ms: Optional[int] = None,
+              seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Plays one game
+
+    Args:
+        factories: the bot factories of the tournament
+        seating: the bot (index into factories) of each seat
+        side: board size
+        players: number of players
+        othello: whether to start with an Othello configuration
+        deadline_ms: time each bot may take for a move (or None)
+        seed: the seed of the game (random if None)
+
+    Returns: the result, as a JSON-serializable dict
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+    game = Reversi(side, players, othello)
+    bots = [factories[bot](seat + 1,
+                           rng=random.Random(derive_seed(seed, seat)))
+            for seat, bot in enumerate(seating)]
+    moves = []
+    try:
+        while not game.done:
+            moves.append(list(bots[game.turn - 1].play_move(game,
+                                                            deadline_ms)))
+    finally:
+        for bot in bots:
+            bot.close()
+    return {"seating": list(seating), "winners": game.outcome,
+            "counters": [game.player_counter[p]
+                         for p in range(1, players + 1)],
+            "moves": moves, "seed": seed, "side": side, "players": players,
+            "othello": othello}
+
+
+def replay_game(factories: Sequence[BotFactory], result: Dict[str, Any],
+                deadline_ms: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Plays a game again from its recorded result (one line of the results
+    of run_tournament)
+
+    Args:
+        factories: the bot factories of the tournament
+        result: the recorded result
+        deadline_ms: time each bot may take for a move (or None)
+
+    Returns: the result of the new game, which has the same moves as the
+        recorded one when the bots are deterministic given their rng
+    """
+    return play_game(factories, tuple(result["seating"]), result["side"],
+                     result["players"], result["othello"], deadline_ms,
+                     result["seed"])
+
+
+def _play_chunk(factories: Sequence[BotFactory],
+                jobs: List[Tuple[int, Tuple[int, ...], int]], side: int,
+                players: int, othello: bool,
+                deadline_ms: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Plays a chunk of games in a worker process
+    """
+    results = []
+    for game_id, seating, seed in jobs:
+        result = play_game(factories, seating, side, players, othello,
+                           deadline_ms, seed)
+        result["game"] = game_id
+        results.append(result)
+    return results
+
+
+class Standings:
+    """
+    Running win/draw/loss counts of the bots of a tournament
+    """
+
+    def __init__(self, names: Sequence[str]):
+        """
+        Constructor
+
+        Args:
+            names: the names of the bots
+        """
+        self.names = list(names)
+        self.wins = [0] * len(names)
+        self.draws = [0] * len(names)
+        self.losses = [0] * len(names)
+        self.games = 0
+
+    def add(self, result: Dict[str, Any]) -> None:
+        """
+        Counts the result of a game. A shared win counts as a draw for
+        each of the winners.
+
+        Args:
+            result: a result as returned by play_game
+
+        Returns: None
+        """
+        self.games += 1
+        winners = result["winners"]
+        for seat, bot in enumerate(result["seating"]):
+            if seat + 1 not in winners:
+                self.losses[bot] += 1
+            elif len(winners) == 1:
+                self.wins[bot] += 1
+            else:
+                self.draws[bot] += 1
+
+    def score(self, bot: int) -> Tuple[float, float]:
+        """
+        Computes the score rate of a bot (a win counts 1, a draw 1/2)
+        with the half-width of its 95% confidence interval
+
+        Args:
+            bot: the index of the bot
+
+        Returns: the score rate and the half-width
+        """
+        played = self.wins[bot] + self.draws[bot] + self.losses[bot]
+        if played == 0:
+            return 0.0, 1.0
+        win, draw = self.wins[bot] / played, self.draws[bot] / played
+        rate = win + draw / 2
+        variance = win + draw / 4 - rate * rate
+        return rate, Z_95 * math.sqrt(max(variance, 0.0) / played)
+
+    def report(self) -> str:
+        """
+        Returns one line per bot with its rates and score
+        """
+        lines = [f"after {self.games} games:"]
+        for bot, name in enumerate(self.names):
+            played = max(self.wins[bot] + self.draws[bot]
+                         + self.losses[bot], 1)
+            rate, half = self.score(bot)
+            lines.append(f"  {name}: W {100 * self.wins[bot] / played:.2f}% "
+                         f"D {100 * self.draws[bot] / played:.2f}% "
+                         f"L {100 * self.losses[bot] / played:.2f}% "
+                         f"score {100 * rate:.2f}% ± {100 * half:.2f}%")
+        return "\n".join(lines)
+
+
+def run_tournament(factories: Sequence[BotFactory], num_games: int,
+                   side: int = 8, players: int = 2, othello: bool = True,
+                   workers: Optional[int] = None, chunk_size: int = 16,
+                   deadline_ms: Optional[int] = None,
+                   out: Optional[IO[str]] = None,
+                   log: Optional[IO[str]] = sys.stderr,
+                   report_every: int = 100,
+                   names: Optional[Sequence[str]] = None,
+                   seed: Optional[int] = None,
+                   stop: Optional[Callable[[Standings], bool]] = None
+                   ) -> Standings:
+    """
+    Plays a tournament between two or more bots
+
+    Args:
+        factories: the bot factories
+        num_games: number of games to play
+        side: board size
+        players: number of players of each game
+        othello: whether games start with an Othello configuration
+        workers: number of worker processes (the number of CPUs if None)
+        chunk_size: number of games sent to a worker at once
+        deadline_ms: time each bot may take for a move (or None)
+        out: where to write one JSON line per game (or None)
+        log: where to write the rolling standings (or None)
+        report_every: number of games between two reports
+        names: names of the bots (taken from the factories if None)
+        seed: master seed from which the seeds of the games are derived
+            (random if None)
+        stop: called with the standings after every game; the
+            tournament ends early (and games still running are
+            dropped) as soon as it returns True
+
+    Raises:
+        ValueError: If fewer than two bots are given
+
+    Returns: the final standings
+    """
+    if len(factories) < 2:
+        raise ValueError("a tournament needs at least two bots")
+    if names is None:
+        names = [bot_name(factory) for factory in factories]
+    standings = Standings(names)
+    seats = seatings(len(factories), players)
+    if seed is None:
+        seed = random.getrandbits(64)
+    jobs = [(game_id, seats[game_id % len(seats)], derive_seed(seed, game_id))
+            for game_id in range(num_games)]
+
+    chunks = [jobs[i:i + chunk_size] for i in range(0, num_games, chunk_size)]
+    chunks.reverse()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as executor:
+        in_flight = 2 * workers
+        pending = set()
+        stopped = False
+        while (chunks or pending) and not stopped:
+            while chunks and len(pending) < in_flight:
+                pending.add(executor.submit(_play_chunk, list(factories),
+                                            chunks.pop(), side, players,
+                                            othello, deadline_ms))
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for result in future.result():
+                    result["bots"] = [names[bot]
+                                      for bot in result["seating"]]
+                    if out is not None:
+                        out.write(json.dumps(result) + "\n")
+                        out.flush()
+                    standings.add(result)
+                    if (log is not None
+                            and standings.games % report_every == 0):
+                        print(standings.report(), file=log)
+                    if stop is not None and stop(standings):
+                        stopped = True
+                        break
+                if stopped:
+                    break
+        executor.shutdown(cancel_futures=True)
+    if log is not None and standings.games % report_every != 0:
+        print(standings.report(), file=log)
+    return standings
+
+
+def elo_to_score(elo: float) -> float:
+    """
+    Returns the expected score of a player rated elo points above its
+    opponent
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+class SPRT:
+    """
+    Sequential probability ratio test between two hypotheses on the Elo
+    difference of two bots: H0, the first bot is elo0 points stronger
+    (usually 0, equal strength), and H1, it is elo1 points stronger. The
+    log-likelihood ratio of the results so far is compared to bounds
+    given by the error rates, using the normal approximation of the
+    score distribution (draws included).
+    """
+
+    def __init__(self, elo0: float = 0.0, elo1: float = 10.0,
+                 alpha: float = 0.05, beta: float = 0.05):
+        """
+        Constructor
+
+        Args:
+            elo0: the Elo difference under H0
+            elo1: the Elo difference under H1 (larger than elo0)
+            alpha: the probability of accepting H1 when H0 is true
+            beta: the probability of accepting H0 when H1 is true
+
+        Raises:
+            ValueError: If elo1 is not larger than elo0, or an error rate
+                is not between 0 and 1
+        """
+        if elo1 <= elo0:
+            raise ValueError("elo1 must be larger than elo0")
+        if not (0 < alpha < 1 and 0 < beta < 1):
+            raise ValueError("error rates must be between 0 and 1")
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+
+    def llr(self, wins: int, draws: int, losses: int) -> float:
+        """
+        Computes the log-likelihood ratio of H1 against H0
+
+        Args:
+            wins: number of wins of the first bot
+            draws: number of draws
+            losses: number of losses of the first bot
+
+        Returns: the log-likelihood ratio (0 while it can not be
+            estimated yet)
+        """
+        games = wins + draws + losses
+        if games == 0:
+            return 0.0
+        win, draw, loss = wins / games, draws / games, losses / games
+        score = win + draw / 2
+        variance = (win * (1 - score) ** 2 + draw * (0.5 - score) ** 2
+                    + loss * score ** 2)
+        if variance == 0:
+            return 0.0
+        s0, s1 = elo_to_score(self.elo0), elo_to_score(self.elo1)
+        return games * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+
+    def decide(self, wins: int, draws: int, losses: int) -> Optional[str]:
+        """
+        Checks whether the test is over
+
+        Args:
+            wins: number of wins of the first bot
+            draws: number of draws
+            losses: number of losses of the first bot
+
+        Returns: "H1" if the first bot is shown stronger, "H0" if it is
+            shown not stronger, None if more games are needed
+        """
+        llr = self.llr(wins, draws, losses)
+        if llr >= self.upper:
+            return "H1"
+        if llr <= self.lower:
+            return "H0"
+        return None
+
+
+class MatchResult(NamedTuple):
+    """
+    Result of a match.
+
+    Attributes:
+        decision: "H1" if the first bot was shown stronger, "H0" if it
+            was shown not stronger, None if the game limit came first
+        llr: the final log-likelihood ratio
+        standings: the standings of the two bots
+    """
+    decision: Optional[str]
+    llr: float
+    standings: Standings
+
+
+def run_match(first: BotFactory, second: BotFactory,
+              sprt: Optional[SPRT] = None, max_games: int = 100000,
+              **kwargs) -> MatchResult:
+    """
+    Plays games between two bots until a sequential probability ratio
+    test decides whether the first bot is stronger
+
+    Args:
+        first: the bot under test
+        second: the bot it is compared with
+        sprt: the test (SPRT() if None)
+        max_games: the largest number of games to play
+        kwargs: other arguments of run_tournament
+
+    Returns: the decision of the test
+    """
+    if sprt is None:
+        sprt = SPRT()
+
+    def stop(standings: Standings) -> bool:
+        return sprt.decide(standings.wins[0], standings.draws[0],
+                           standings.losses[0]) is not None
+
+    standings = run_tournament([first, second], max_games, stop=stop,
+                               **kwargs)
+    counts = (standings.wins[0], standings.draws[0], standings.losses[0])
+    return MatchResult(sprt.decide(*counts), sprt.llr(*counts), standings)
@@ -1,12 +1,15 @@
 """
 TUI for Reversi
 """
-from typing import Optional, List
+import shlex
+from typing import Optional, List, Tuple
 
 import click
 from colored import fore # type: ignore
 
-from reversi import ReversiBase, Reversi, PieceColor
+from reversi import ReversiBase, Reversi, PieceColor, MoveDelta
+from bot import Bot, SearchBot
+from engine import RemoteBot
 
 color_dict = {1 : PieceColor["BLACK"], 2 : PieceColor["WHITE"], 3 : \
     PieceColor["RED"], 4 : PieceColor["GREEN"], 5: PieceColor["YELLOW"], 6: \
@@ -24,8 +27,13 @@ class TUIPlayer:
     name: str
     reversi: Reversi
     color: PieceColor
+    bot: Optional[Bot]
+    deadline_ms: int
+    ponder: bool
 
-    def __init__(self, n: int, reversi: Reversi, color: PieceColor):
+    def __init__(self, n: int, reversi: Reversi, color: PieceColor,
+                 bot: Optional[Bot] = None, deadline_ms: int = 1000,
+                 ponder: bool = False):
         """
         Constructor
 
@@ -33,17 +41,29 @@ class TUIPlayer:
             n: The player's number
             reversi: The Reversi game
             color: The player's color
+            bot: The bot that plays for this player (None for a human)
+            deadline_ms: The time a bot may take for a move, in
+                milliseconds
+            ponder: Whether the bot keeps searching while a human picks
+                a move
         """
         self.name = f"Player {n}"
         self.reversi = reversi
         self.color = color
+        self.bot = bot
+        self.deadline_ms = deadline_ms
+        self.ponder = ponder
 
     def get_move(self) -> int:
         """
         Gets a move from the player
 
-        Returns: None
+        Returns: the index of the move in the list of available moves
         """
+        if self.bot is not None:
+            move = self.bot.choose_move(self.reversi, self.deadline_ms)
+            print(f"{self.name}> {move[1] + 1, move[0] + 1}")
+            return self.reversi.available_moves.index(move)
         while True:
             v = input(f"{self.name}> ")
             if v.isnumeric():
@@ -54,44 +74,52 @@ class TUIPlayer:
                     print("Invalid move, please select another")
 
 
-def print_board(grid: List[List[Optional[int]]]) -> None:
+def render_row(row: List[Optional[int]]) -> str:
     """
-    Prints the board to the screen
+    Renders one row of the board
     Args:
-        grid: The board to print
-    Returns: None
+        row: The row to render
+    Returns: the row as a string of colored pieces and separators
     """
+    crow = "│"
+    for v in row:
+        if v is None:
+            crow += " "
+        elif v == 1:
+            crow += fore.BLACK + "●"
+        elif v == 2:
+            crow += fore.WHITE + "●"
+        elif v == 3:
+            crow += fore.RED + "●"
+        elif v == 4:
+            crow += fore.GREEN + "●"
+        elif v == 5:
+            crow += fore.YELLOW + "●"
+        elif v == 6:
+            crow += fore.BLUE + "●"
+        elif v == 7:
+            crow += fore.MAGENTA + "●"
+        elif v == 8:
+            crow += fore.CYAN + "●"
+        elif v == 9:
+            crow += fore.VIOLET + "●"
+        crow += fore.WHITE + "│"
+    return crow
+
 
-    nrows = len(grid)
-    ncols = len(grid[0])
+def print_rows(rows: List[str], ncols: int) -> None:
+    """
+    Prints already rendered rows of the board, with the grid lines
+    Args:
+        rows: The rendered rows (as returned by render_row)
+        ncols: The number of columns of the board
+    Returns: None
+    """
+    nrows = len(rows)
 
     print(fore.WHITE + "┌" + ("─┬" * (ncols-1)) + "─┐")
 
-    for r in range(nrows):
-        crow = "│"
-        for c in range(ncols):
-            v = grid[r][c]
-            if v is None:
-                crow += " "
-            elif v == 1:
-                crow += fore.BLACK + "●"
-            elif v == 2:
-                crow += fore.WHITE + "●"
-            elif v == 3:
-                crow += fore.RED + "●"
-            elif v == 4:
-                crow += fore.GREEN + "●"
-            elif v == 5:
-                crow += fore.YELLOW + "●"
-            elif v == 6:
-                crow += fore.BLUE + "●"
-            elif v == 7:
-                crow += fore.MAGENTA + "●"
-            elif v == 8:
-                crow += fore.CYAN + "●"
-            elif v == 9:
-                crow += fore.VIOLET + "●"
-            crow += fore.WHITE + "│"
+    for r, crow in enumerate(rows):
         print(crow)
 
         if r < nrows - 1:
@@ -99,6 +127,16 @@ def print_board(grid: List[List[Optional[int]]]) -> None:
         else:
             print(fore.WHITE + "└" + ("─┴" * (ncols-1)) + "─┘")
 
+
+def print_board(grid: List[List[Optional[int]]]) -> None:
+    """
+    Prints the board to the screen
+    Args:
+        grid: The board to print
+    Returns: None
+    """
+    print_rows([render_row(row) for row in grid], len(grid[0]))
+
 def play_reversi(reversi: ReversiBase,
                  players: list[TUIPlayer]) -> None:
     """
@@ -113,9 +151,20 @@ def play_reversi(reversi: ReversiBase,
 
     current = players[0]
     board = reversi.grid
+    rows = [render_row(row) for row in board]
+
+    def on_move(delta: MoveDelta) -> None:
+        changed = {delta.position[0]}
+        changed.update(r for r, _ in delta.flipped)
+        for r in changed:
+            rows[r] = render_row(reversi.grid[r])
+
+    incremental = isinstance(reversi, Reversi)
+    if incremental:
+        reversi.add_listener(on_move)
 
     print()
-    print_board(board)
+    print_rows(rows, len(board))
     print()
 
     while not reversi.done:
@@ -127,14 +176,28 @@ def play_reversi(reversi: ReversiBase,
         column = current.get_move()
         move = moves[column]
         reversi.apply_move(move)
+        mover = current
 
         try:
             current = players[reversi.turn - 1]
         except IndexError:
             current = players[0]
 
+        if mover.bot is not None and mover.ponder and current.bot is None\
+            and not reversi.done:
+            mover.bot.ponder(reversi)
+
         print()
-        print_board(reversi.grid)
+        if incremental:
+            print_rows(rows, len(board))
+        else:
+            print_board(reversi.grid)
+
+    if incremental:
+        reversi.remove_listener(on_move)
+    for player in players:
+        if player.bot is not None:
+            player.bot.stop_pondering()
 
     winner = reversi.outcome
     if winner is not None and len(winner) == 1:
@@ -148,7 +211,12 @@ def play_reversi(reversi: ReversiBase,
 @click.option('-s', '--board-size', type = click.INT, default = 8)
 @click.option('--othello', 'mode', flag_value = 'othello', default = True)
 @click.option('--non-othello', 'mode', flag_value = 'non-othello')
-def cmd(num_players: int, board_size: int, mode: str) -> None:
+@click.option('-b', '--bot', 'bots', type = click.INT, multiple = True)
+@click.option('--deadline-ms', type = click.INT, default = 1000)
+@click.option('--ponder', is_flag = True)
+@click.option('-e', '--engine', type = click.STRING, default = None)
+def cmd(num_players: int, board_size: int, mode: str, bots: Tuple[int, ...],
+        deadline_ms: int, ponder: bool, engine: Optional[str]) -> None:
     """
     Allows specifications for playing reveersi in the terminal
 
@@ -156,6 +224,11 @@ def cmd(num_players: int, board_size: int, mode: str) -> None:
         num_players: number of play6ers
         board_size: size of the board
         mode: othello or not othello
+        bots: numbers of the players played by a bot
+        deadline_ms: time a bot may take for a move, in milliseconds
+        ponder: whether bots keep searching while a human picks a move
+        engine: command starting an engine process for the bots (bots
+            run in the TUI process if None)
 
     Returns: None
     """
@@ -168,9 +241,18 @@ def cmd(num_players: int, board_size: int, mode: str) -> None:
     for num in range(num_players):
         player_num = num + 1
         color = color_dict[player_num]
-        player = TUIPlayer(player_num, game, color)
+        bot: Optional[Bot] = None
+        if player_num in bots and engine is not None:
+            bot = RemoteBot(player_num, shlex.split(engine))
+        elif player_num in bots:
+            bot = SearchBot(player_num)
+        player = TUIPlayer(player_num, game, color, bot, deadline_ms,
+                           ponder)
         players.append(player)
     play_reversi(game, players)
+    for player in players:
+        if player.bot is not None:
+            player.bot.close()
 
 if __name__ == "__main__":
     cmd()
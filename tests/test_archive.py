@@ -0,0 +1,88 @@
+"""
+Tests for the position archive
+"""
+import io
+import json
+
+import pytest
+
+from reversi import Reversi, GameState, play
+from bot import RandomBot
+from tournament import play_game
+from book import symmetries
+from archive import Archive
+
+
+@pytest.fixture
+def archive(tmp_path):
+    results = [play_game([RandomBot], (0, 0), 6, 2, True, seed=seed)
+               for seed in range(5)]
+    lines = "".join(json.dumps(result) + "\n" for result in results)
+    with Archive(str(tmp_path / "positions.db")) as archive:
+        assert archive.add_results(io.StringIO(lines)) == 5
+        yield archive, results
+
+
+def test_archive_keeps_every_position(archive):
+    """
+    Tests that every position of every game is stored, with the move
+    played from it
+    """
+    archive, results = archive
+    assert len(archive) == sum(len(r["moves"]) + 1 for r in results)
+    games = list(archive.query(players=2))
+    rev = Reversi(6, 2, True)
+    for position, move in zip(games, results[0]["moves"]):
+        assert position.game == 0
+        assert position.state == GameState.from_reversi(rev)
+        assert position.move == tuple(move)
+        assert position.winners == results[0]["winners"]
+        rev.apply_move(tuple(move))
+    assert games[len(results[0]["moves"])].move is None
+
+
+def test_archive_square_query(archive):
+    """
+    Tests a query on empties, player to move and an empty corner
+    """
+    archive, _ = archive
+    found = list(archive.query(empties=21, turn=2, side=6,
+                               squares={(0, 0): 0}))
+    everything = [p for p in archive.query()
+                  if p.state.empties == 21 and p.state.turn == 2
+                  and p.state.board[0] == 0]
+    assert found == everything
+    assert found
+    assert list(archive.query(empties=20, limit=1)) == \
+        list(archive.query(empties=20))[:1]
+    with pytest.raises(ValueError):
+        archive.query(squares={(0, 0): 0})
+
+
+def test_archive_finds_symmetric_positions(archive):
+    """
+    Tests that a position is found from any of its symmetries
+    """
+    archive, results = archive
+    state = GameState.from_reversi(Reversi(6, 2, True))
+    for move in results[0]["moves"][:6]:
+        state = play(state, tuple(move))
+    perm = symmetries(6)[5]
+    mirrored = state._replace(board=tuple(state.board[i] for i in perm))
+    found = archive.find(mirrored)
+    assert any(p.game == 0 and p.ply == 6 for p in found)
+    assert all(p.state.empties == state.empties for p in found)
+
+
+def test_archive_numbers_games_from_index(archive):
+    """
+    Tests that new games are numbered after the last one, with a lookup
+    of the index on game rather than a scan of every position
+    """
+    archive, results = archive
+    plan = archive.db.execute("EXPLAIN QUERY PLAN "
+                              "SELECT MAX(game) FROM positions").fetchall()
+    assert any("positions_game" in row[-1] for row in plan)
+    result = results[0]
+    assert archive.add_game(6, 2, True, result["moves"],
+                            result["winners"]) == len(results)
@@ -0,0 +1,73 @@
+"""
+Tests for the opening book
+"""
+import pytest
+
+from reversi import Reversi, GameState, legal_moves, play
+from book import (BookBuilder, OpeningBook, build_book, canonical_hash,
+                  symmetries)
+from search import Searcher
+from bot import SearchBot
+
+
+def test_symmetric_positions_share_hash():
+    """
+    Tests that the four first moves of Othello, which are all symmetric,
+    lead to the same canonical hash
+    """
+    state = GameState.from_reversi(Reversi(side=8, players=2, othello=True))
+    hashes = {canonical_hash(play(state, move))[0]
+              for move in legal_moves(state)}
+    assert len(hashes) == 1
+    assert len(symmetries(8)) == 8
+    assert symmetries(8)[0] == tuple(range(64))
+
+
+def test_book_round_trip(tmp_path):
+    """
+    Tests that moves written to a book are found again, turned back to
+    the orientation of the position looked up
+    """
+    state = GameState.from_reversi(Reversi(side=8, players=2, othello=True))
+    after = play(state, (2, 3))
+    builder = BookBuilder()
+    builder.add(state, (2, 3), 1.0)
+    builder.add(after, (2, 2), -2.0)
+    path = str(tmp_path / "book.bin")
+    builder.write(path)
+
+    with OpeningBook(path) as book:
+        assert len(book) == 2
+        assert book.lookup(state) == ((2, 3), 1)
+        assert book.lookup(after) == ((2, 2), -2)
+        mirrored = play(state, (5, 4))
+        move, score = book.lookup(mirrored)
+        assert move == (5, 5)
+        assert move in legal_moves(mirrored)
+        assert book.lookup(play(after, (2, 2))) is None
+
+
+def test_build_book_and_bot(tmp_path):
+    """
+    Tests that a bot plays the book move without searching
+    """
+    rev = Reversi(side=6, players=2, othello=True)
+    path = str(tmp_path / "book.bin")
+    count = build_book(path, rev, 2, Searcher(max_depth=2))
+    assert count == 2
+
+    with OpeningBook(path) as book:
+        bot = SearchBot(1, book=book)
+        move = bot.choose_move(rev)
+        assert move == book.lookup(rev)[0]
+        assert bot.searcher.nodes == 0
+
+
+def test_not_a_book(tmp_path):
+    """
+    Tests that opening another kind of file raises a ValueError
+    """
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a book at all")
+    with pytest.raises(ValueError):
+        OpeningBook(str(path))
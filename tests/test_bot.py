@@ -0,0 +1,123 @@
+"""
+Tests for the bots
+"""
+import time
+
+import pytest
+
+from reversi import Reversi, GameState
+from bot import RandomBot, SmartBot, SearchBot, MCTSBot
+
+
+@pytest.mark.parametrize("bot_class", [RandomBot, SmartBot, SearchBot,
+                                       MCTSBot])
+def test_bots_play_legal_moves(bot_class):
+    """
+    Tests that every bot plays a full game of legal moves against itself
+    within its deadline
+    """
+    rev = Reversi(side=6, players=2, othello=True)
+    bots = {1: bot_class(1), 2: bot_class(2)}
+    while not rev.done:
+        moves = rev.available_moves
+        bot = bots[rev.turn]
+        move = bot.choose_move(rev, 50)
+        assert move in moves
+        rev.apply_move(move)
+        bot.moves.append(move)
+    assert rev.outcome
+    for bot in bots.values():
+        bot.close()
+
+
+@pytest.mark.parametrize("deadline_ms", [30, 150])
+def test_search_bot_meets_deadline(deadline_ms):
+    """
+    Tests that a deep search is cut off at the deadline and still returns
+    a legal move
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    bot = SearchBot(1, depth=30)
+    start = time.perf_counter()
+    move = bot.choose_move(rev, deadline_ms)
+    elapsed = (time.perf_counter() - start) * 1000
+    assert move in rev.available_moves
+    assert elapsed < deadline_ms + 100
+
+
+@pytest.mark.parametrize("bot_class", [SearchBot, MCTSBot])
+@pytest.mark.parametrize("side", [14, 20])
+def test_bots_meet_deadline_on_large_boards(bot_class, side):
+    """
+    Tests that the deadline holds on boards where a single node or
+    playout is slow
+    """
+    rev = Reversi(side=side, players=2, othello=True)
+    bot = bot_class(1)
+    start = time.perf_counter()
+    move = bot.choose_move(rev, 100)
+    elapsed = (time.perf_counter() - start) * 1000
+    bot.close()
+    assert move in rev.available_moves
+    assert elapsed < 150
+
+
+def test_play_move_applies_move():
+    """
+    Tests that play_move applies and records the chosen move
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    bot = SmartBot(1)
+    move = bot.play_move(rev)
+    assert rev.piece_at(move) == 1
+    assert bot.moves == [move]
+    assert rev.turn == 2
+
+
+def test_smart_bot_picks_first_greediest_move():
+    """
+    Tests that the greedy bot plays the first move (in row-major order)
+    among those that flip the most pieces
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    for move in [(2, 3), (2, 2), (2, 1)]:
+        rev.apply_move(move)
+    counts = rev.move_flips()
+    best = max(counts.values())
+    expected = next(move for move in rev.available_moves
+                    if counts[move] == best)
+    assert SmartBot(rev.turn).choose_move(rev) == expected
+
+
+@pytest.mark.parametrize("bot_class", [SearchBot, MCTSBot])
+def test_bot_ponders_on_opponent_time(bot_class):
+    """
+    Tests that a bot keeps searching after its move until the opponent
+    replies, and then plays a legal move
+    """
+    rev = Reversi(side=6, players=2, othello=True)
+    bot = bot_class(1)
+    bot.play_move(rev, 50)
+    bot.ponder(rev)
+    time.sleep(0.1)
+    rev.apply_move(rev.available_moves[0])
+    if bot_class is MCTSBot:
+        before = bot.mcts.root.visits
+    move = bot.choose_move(rev, 50)
+    assert move in rev.available_moves
+    assert bot._ponder_thread is None
+    if bot_class is MCTSBot:
+        assert before > 0
+        assert bot.mcts.root.state == GameState.from_reversi(rev)
+    bot.close()
+
+
+def test_batched_mcts_bot():
+    """
+    Tests that an MCTS bot evaluating leaves in batches plays legal moves
+    """
+    rev = Reversi(side=6, players=2, othello=True)
+    bot = MCTSBot(1, batch_size=4, seed=1)
+    move = bot.choose_move(rev, 50)
+    assert move in rev.available_moves
+    assert bot.mcts.root.visits % 4 == 0
@@ -0,0 +1,108 @@
+"""
+Tests for the endgame solver
+"""
+import random
+import threading
+import time
+
+import pytest
+
+from reversi import Reversi, GameState, legal_moves, play
+from endgame import EndgameSolver, SolveAborted
+from search import Searcher, WIN_SCORE
+
+
+def perfect_play(state: GameState) -> int:
+    """
+    Final disc difference for the player to move, by plain minimax
+    """
+    moves = legal_moves(state)
+    if not moves:
+        player = state.turn
+        return state.counters[player - 1] - state.counters[2 - player]
+    best = -state.side ** 2
+    for move in moves:
+        child = play(state, move)
+        score = perfect_play(child)
+        best = max(best, score if child.turn == state.turn else -score)
+    return best
+
+
+def random_endgame(seed: int, empties: int) -> GameState:
+    """
+    Plays random moves on a 6x6 Othello board until few squares are left
+    """
+    rng = random.Random(seed)
+    state = GameState.from_reversi(Reversi(side=6, players=2, othello=True))
+    while state.empties > empties and legal_moves(state):
+        state = play(state, rng.choice(legal_moves(state)))
+    return state
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_solver_is_exact(seed):
+    """
+    Tests that the solver finds the minimax disc difference, and that its
+    move achieves it
+    """
+    state = random_endgame(seed, 7)
+    if not legal_moves(state):
+        return
+    expected = perfect_play(state)
+    result = EndgameSolver(max_empties=8).solve(state)
+    assert result.score == expected
+
+    child = play(state, result.move)
+    score = perfect_play(child)
+    assert (score if child.turn == state.turn else -score) == expected
+
+    wld = EndgameSolver(max_empties=8, exact=False).solve(state)
+    assert wld.outcome == result.outcome
+
+
+def test_solver_range():
+    """
+    Tests which positions the solver accepts
+    """
+    solver = EndgameSolver(max_empties=10)
+    assert not solver.can_solve(Reversi(side=8, players=2, othello=True))
+    assert not solver.can_solve(Reversi(side=7, players=3, othello=False))
+    assert solver.can_solve(random_endgame(0, 10))
+    with pytest.raises(ValueError):
+        solver.solve(Reversi(side=8, players=2, othello=True))
+
+
+@pytest.mark.parametrize("seed", [0, 2, 3, 4])
+def test_searcher_uses_solver(seed):
+    """
+    Tests that a searcher with an endgame solver returns exact scores:
+    0 for a draw, WIN_SCORE plus the disc difference otherwise
+    """
+    state = random_endgame(seed, 8)
+    expected = perfect_play(state)
+    result = Searcher(endgame=EndgameSolver(max_empties=8)).search(state)
+    if expected == 0:
+        assert result.score == 0.0
+    else:
+        assert abs(result.score) >= WIN_SCORE
+        assert result.score - (WIN_SCORE if expected > 0 else -WIN_SCORE) \
+            == expected
+
+
+def test_solver_stop_event():
+    """
+    Tests that a solve, and a search that hands its position to the
+    solver, end soon after their stop event is set
+    """
+    state = random_endgame(1, 16)
+    stop = threading.Event()
+    stop.set()
+    solver = EndgameSolver(max_empties=16)
+    with pytest.raises(SolveAborted):
+        solver.solve(state, stop=stop)
+    assert solver.nodes == EndgameSolver.CHECK_EVERY
+
+    start = time.perf_counter()
+    result = Searcher(endgame=solver).search(state, stop)
+    assert result.move in legal_moves(state)
+    assert time.perf_counter() - start < 1.0
@@ -0,0 +1,84 @@
+"""
+Tests for engines running in their own process
+"""
+import io
+import json
+import time
+
+import pytest
+
+from reversi import Reversi
+from bot import RandomBot
+from engine import (run_engine, position_message, engine_command,
+                    EngineClient, EngineError, RemoteBot)
+
+
+def test_run_engine_answers_commands():
+    """
+    Tests the answers of an engine to a sequence of commands
+    """
+    rev = Reversi(side=6, players=2, othello=True)
+    commands = [{"cmd": "isready"}, {"cmd": "go", "time_ms": 50},
+                position_message(rev), {"cmd": "go", "time_ms": 50},
+                {"cmd": "fly"}, {"cmd": "quit"}, {"cmd": "isready"}]
+    infile = io.StringIO("".join(json.dumps(c) + "\n" for c in commands))
+    outfile = io.StringIO()
+    run_engine(RandomBot, infile, outfile)
+    answers = [json.loads(line) for line in outfile.getvalue().splitlines()]
+    assert [a["type"] for a in answers] == ["readyok", "error", "info",
+                                            "bestmove", "error"]
+    assert tuple(answers[3]["move"]) in rev.available_moves
+
+
+def test_remote_bot_plays_a_game():
+    """
+    Tests that a bot running in an engine process plays a full game of
+    legal moves
+    """
+    rev = Reversi(side=6, players=2, othello=False)
+    remote = RemoteBot(1, engine_command("random"))
+    local = RandomBot(2)
+    try:
+        while not rev.done:
+            bot = remote if rev.turn == 1 else local
+            move = bot.choose_move(rev, 100)
+            assert move in rev.available_moves
+            rev.apply_move(move)
+        assert remote.client.info["time_ms"] >= 0
+    finally:
+        remote.close()
+    assert remote.client.process.returncode == 0
+
+
+def test_client_polls_without_blocking():
+    """
+    Tests that a client can poll for the result of a search
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    client = EngineClient(engine_command("random"))
+    try:
+        client.isready()
+        client.go(rev, 100)
+        assert client.thinking
+        move = None
+        deadline = time.monotonic() + 10
+        while move is None and time.monotonic() < deadline:
+            move = client.poll_best_move()
+            time.sleep(0.01)
+        assert move in rev.available_moves
+        assert not client.thinking
+        client.send({"cmd": "bogus"})
+        with pytest.raises(EngineError):
+            client.best_move(10)
+    finally:
+        client.close()
+
+
+def test_client_detects_exit():
+    """
+    Tests that a client reports an engine that exits
+    """
+    client = EngineClient(engine_command("random"))
+    client.close()
+    with pytest.raises(EngineError):
+        client.best_move(1)
@@ -0,0 +1,145 @@
+"""
+Tests for the position evaluation
+"""
+import math
+
+import evaluation
+from reversi import Reversi, GameState, play
+from evaluation import (Evaluator, evaluate, evaluate_batch,
+                        rewards_batch, features, raw_features, edge_table,
+                        edge_lines, edge_pattern_score, line_code,
+                        square_table, FEATURES)
+
+
+def test_square_table():
+    """
+    Tests the weights of corners, X- and C-squares on an 8x8 board
+    """
+    table = square_table(8)
+    assert len(table) == 64
+    assert table[0] == table[7] == table[56] == table[63]
+    assert table[9] < table[1] < table[2]
+    assert table[0] > table[2]
+
+
+def test_edge_table_matches_patterns():
+    """
+    Tests that looking up a line code gives the same scores as scoring
+    the line directly
+    """
+    table = edge_table(6, 2)
+    assert len(table) == 3 ** 6
+    board = [0] * 36
+    board[0:6] = [1, 1, 2, 0, 2, 0]
+    line = edge_lines(6)[0]
+    code = line_code(board, line, 3)
+    assert list(table[code]) == edge_pattern_score(board[0:6], 2)
+    assert table[code][0] > 0
+    assert table[code][1] < 0
+    assert edge_table(20, 9) is None
+
+
+def test_evaluation_is_symmetric():
+    """
+    Tests that the starting position is even for both players, and that
+    the evaluation of a player is the opposite of the other's
+    """
+    state = GameState.from_reversi(Reversi(side=8, players=2, othello=True))
+    assert evaluate(state, 1) == 0
+    state = play(state, (3, 2))
+    assert evaluate(state, 1) == -evaluate(state, 2)
+    assert len(features(state, 1)) == len(FEATURES)
+
+
+def test_corner_is_good():
+    """
+    Tests that owning a corner is better than owning the X-square next to
+    it
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    grid = [[None] * 8 for _ in range(8)]
+    grid[3][3] = grid[4][4] = 2
+    grid[3][4] = grid[4][3] = 1
+    grid[0][0] = 1
+    corner = Reversi(side=8, players=2, othello=True)
+    corner.load_game(2, grid)
+    grid[0][0] = None
+    grid[1][1] = 1
+    x_square = Reversi(side=8, players=2, othello=True)
+    x_square.load_game(2, grid)
+    assert evaluate(GameState.from_reversi(corner), 1) > \
+        evaluate(GameState.from_reversi(x_square), 1)
+
+
+def test_batch_matches_single():
+    """
+    Tests that evaluating a batch gives the same scores one by one
+    """
+    state = GameState.from_reversi(Reversi(side=7, players=3, othello=False))
+    states = [state]
+    for move in [(2, 2), (2, 3), (2, 4), (3, 2)]:
+        states.append(play(states[-1], move))
+    evaluator = Evaluator((1.0, 2.0, 3.0, 4.0, 5.0))
+    assert evaluator.evaluate_batch(states) == \
+        [evaluator(s, s.turn) for s in states]
+    assert evaluator.evaluate_batch(states, 1) == \
+        [evaluator(s, 1) for s in states]
+    assert evaluate_batch(states) == [evaluate(s, s.turn) for s in states]
+
+
+def test_rewards_batch():
+    """
+    Tests that rewards add up to one and favor the better evaluated
+    player
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    grid = [[None] * 8 for _ in range(8)]
+    grid[0][0] = grid[0][1] = grid[7][7] = 1
+    grid[3][3] = grid[4][4] = 2
+    grid[3][4] = grid[4][3] = 1
+    rev.load_game(2, grid)
+    states = [GameState.from_reversi(Reversi(8, 2, True)),
+              GameState.from_reversi(rev)]
+    rewards = rewards_batch(states)
+    for row in rewards:
+        assert abs(sum(row) - 1) < 1e-9
+    assert abs(rewards[0][0] - 0.5) < 1e-9
+    assert rewards[1][0] > 0.5
+
+
+def test_batch_scans_each_position_once(monkeypatch):
+    """
+    Tests that a batch derives the rewards of every player from a single
+    scan of each distinct position, and matches evaluating each player
+    on its own
+    """
+    state = GameState.from_reversi(Reversi(side=7, players=3, othello=False))
+    states = [state]
+    for move in [(2, 2), (2, 3), (2, 4), (3, 2), (4, 3)]:
+        states.append(play(states[-1], move))
+    for s in states:
+        raw = raw_features(s)
+        for player in range(1, 4):
+            assert [v[player - 1] - max(x for p, x in enumerate(v, 1)
+                                        if p != player)
+                    for v in raw] == features(s, player)
+
+    evaluator = Evaluator((1.0, 2.0, 3.0, 4.0, 5.0))
+    expected = []
+    for s in states:
+        scores = [evaluator(s, player) for player in range(1, 4)]
+        exps = [math.exp((x - max(scores)) / 20.0) for x in scores]
+        expected.append([e / sum(exps) for e in exps])
+
+    scans = []
+    original = evaluation.raw_features
+
+    def counting(state):
+        scans.append(state)
+        return original(state)
+
+    monkeypatch.setattr(evaluation, "raw_features", counting)
+    rewards = evaluator.rewards_batch(states + states[:2])
+    assert len(scans) == len(states)
+    for row, want in zip(rewards, expected + expected[:2]):
+        assert all(abs(a - b) < 1e-12 for a, b in zip(row, want))
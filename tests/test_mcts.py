@@ -0,0 +1,118 @@
+"""
+Tests for Monte Carlo Tree Search
+"""
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from reversi import Reversi, GameState, legal_moves, play
+from mcts import MCTS, rollout, best_move, parallel_search
+from evaluation import rewards_batch
+
+
+def test_rollout_finishes_game():
+    """
+    Tests that a rollout hands out exactly one unit of reward
+    """
+    rng = random.Random(0)
+    for side, players, othello in [(8, 2, True), (7, 3, False)]:
+        state = GameState.from_reversi(Reversi(side, players, othello))
+        rewards = rollout(state, rng)
+        assert len(rewards) == players
+        assert abs(sum(rewards) - 1.0) < 1e-9
+
+
+def test_mcts_visits():
+    """
+    Tests that every playout is accounted for at the root
+    """
+    state = GameState.from_reversi(Reversi(side=6, players=2, othello=True))
+    search = MCTS(rng=random.Random(1))
+    counts = search.search(state, iterations=200)
+    assert set(counts) == set(legal_moves(state))
+    assert sum(counts.values()) == 200
+    assert best_move(counts) in legal_moves(state)
+
+
+def test_mcts_takes_win():
+    """
+    Tests that the search finds the only winning move of a three-player
+    position
+    """
+    rev = Reversi(side=7, players=3, othello=False)
+    grid = [[1, 1, 1, 1, 1, 1, 1], [1, 1, 1, 1, 1, 1, 1],
+            [1, 1, 1, 1, 1, 1, 1], [1, 1, 1, 1, 1, 1, 1],
+            [1, None, 2, 3, 3, 2, 1], [2, 2, 2, 2, 2, 2, 2],
+            [3, 3, 3, 3, 3, 3, 3]]
+    rev.load_game(1, grid)
+    state = GameState.from_reversi(rev)
+    counts = MCTS(rng=random.Random(2)).search(state, iterations=20)
+    assert best_move(counts) == (4, 1)
+
+
+def test_parallel_search():
+    """
+    Tests that root-parallel search adds up the visits of all workers
+    """
+    state = GameState.from_reversi(Reversi(side=6, players=2, othello=True))
+    state = play(state, legal_moves(state)[0])
+    with ProcessPoolExecutor(2) as executor:
+        counts = parallel_search(executor, state, 2, iterations=50, seed=3)
+    assert sum(counts.values()) == 100
+    assert set(counts) <= set(legal_moves(state))
+
+
+def test_mcts_reuses_subtree():
+    """
+    Tests that a search of a position reached from the previous root
+    keeps the visits already made below it
+    """
+    state = GameState.from_reversi(Reversi(8, 2, True))
+    mcts = MCTS(rng=random.Random(2))
+    counts = mcts.search(state, iterations=500)
+    move = best_move(counts)
+    after = play(state, move)
+    reply = max(mcts.root.children, key=lambda c: c.visits).children[0]
+    reached = play(after, reply.move)
+    kept = reply.visits
+    mcts.search(reached, iterations=100, reuse=True)
+    assert mcts.root.state == reached
+    assert mcts.root.parent is None
+    assert mcts.root.visits == kept + 100
+    mcts.search(reached, iterations=10)
+    assert mcts.root.visits == 10
+
+
+def test_mcts_stop_event():
+    """
+    Tests that a search without limits runs until its stop event is set
+    """
+    state = GameState.from_reversi(Reversi(6, 2, True))
+    stop = threading.Event()
+    mcts = MCTS(rng=random.Random(0))
+    timer = threading.Timer(0.1, stop.set)
+    timer.start()
+    counts = mcts.search(state, stop=stop)
+    assert stop.is_set()
+    assert sum(counts.values()) > 1
+
+
+def test_batched_mcts():
+    """
+    Tests that a batched search evaluates whole batches of leaves with
+    one call each, and still finds a winning move
+    """
+    calls = []
+
+    def evaluator(states):
+        calls.append(len(states))
+        return rewards_batch(states)
+
+    state = GameState.from_reversi(Reversi(8, 2, True))
+    mcts = MCTS(rng=random.Random(0), evaluator=evaluator, batch_size=8)
+    counts = mcts.search(state, iterations=200)
+    assert mcts.root.visits == 200
+    assert sum(counts.values()) == 200
+    assert len(calls) == 25
+    assert all(n <= 8 for n in calls)
+    assert best_move(counts) in legal_moves(state)
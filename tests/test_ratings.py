@@ -0,0 +1,75 @@
+"""
+Tests for the ratings of bots
+"""
+import io
+import json
+
+import pytest
+
+from ratings import Ratings, rate_file
+
+
+def game(first, second, winners):
+    return {"bots": [first, second], "winners": winners}
+
+
+def test_elo_is_zero_sum():
+    """
+    Tests that Elo updates move ratings in opposite directions
+    """
+    ratings = Ratings(k=32)
+    ratings.add(game("a", "b", [1]))
+    elo = ratings.elo_ratings
+    assert elo["a"] == pytest.approx(1516)
+    assert elo["b"] == pytest.approx(1484)
+    ratings.add(game("b", "a", [1, 2]))
+    assert sum(ratings.elo_ratings.values()) == pytest.approx(3000)
+
+
+def test_bradley_terry_fits_score_rate():
+    """
+    Tests that a bot scoring 75% against another is rated
+    400 * log10(3) points above it
+    """
+    ratings = Ratings(prior=0, refit_every=0)
+    for _ in range(30):
+        ratings.add(game("a", "b", [1]))
+        ratings.add(game("b", "a", [2]))
+        ratings.add(game("a", "b", [1]))
+        ratings.add(game("a", "b", [2]))
+    ratings.refit()
+    bt = ratings.bradley_terry
+    assert bt["a"] - bt["b"] == pytest.approx(400 * 0.47712125, abs=1e-3)
+    assert bt["a"] + bt["b"] == pytest.approx(3000)
+
+
+def test_multiplayer_games_count_pairs():
+    """
+    Tests that a three-player game counts as three pairwise games
+    """
+    ratings = Ratings()
+    ratings.add({"bots": ["a", "b", "c"], "winners": [1, 3]})
+    i, j, k = (ratings.index[name] for name in "abc")
+    assert ratings.points[i][k] == 0.5
+    assert ratings.points[i][j] == 1.0
+    assert ratings.points[j][k] == 0.0
+    assert sum(map(sum, ratings.played)) == 6
+
+
+def test_consume_stream_in_pieces():
+    """
+    Tests that results consumed in several pieces give the same ratings
+    as a whole file, and that refits happen as games arrive
+    """
+    lines = [json.dumps(game("a", "b", [1] if n % 3 else [2])) + "\n"
+             for n in range(90)] + ["\n"]
+    whole = rate_file(io.StringIO("".join(lines)))
+    pieces = Ratings(refit_every=40)
+    assert pieces.consume(lines[:50]) == 50
+    assert pieces.bradley_terry["a"] > pieces.bradley_terry["b"]
+    pieces.consume(lines[50:])
+    pieces.refit()
+    assert pieces.elo_ratings == whole.elo_ratings
+    for name, rating in whole.bradley_terry.items():
+        assert pieces.bradley_terry[name] == pytest.approx(rating)
+    assert "a: Bradley-Terry" in whole.report()
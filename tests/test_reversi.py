@@ -1,7 +1,10 @@
+import pickle
+import random
 from typing import List, Tuple
 from enum import Enum
 import pytest
-from reversi import Reversi, Piece, Board, PieceColor
+import reversi
+from reversi import Reversi, Piece, Board, PieceColor, GameState
 
 def helper_apply(rev: Reversi, moves: List[Tuple[int, int]]) -> Reversi:
     """
@@ -997,4 +1000,305 @@ def test_full_board_5():
     rev.apply_move((0, 7))
     
     assert rev.done
-    assert rev.outcome == [2]
\ No newline at end of file
+    assert rev.outcome == [2]
+
+def test_instrumentation_counts_calls():
+    """
+    Tests that enabling instrumentation counts calls to the hot paths, and
+    that disabling it restores the original methods
+    """
+    original = Reversi.__dict__["apply_move"]
+    reversi.reset_stats()
+    reversi.enable_instrumentation()
+    try:
+        assert reversi.instrumentation_enabled()
+        rev = Reversi(side=8, players=2, othello=True)
+        rev.apply_move((3, 2))
+        snapshot = reversi.stats()
+        assert snapshot["apply_move"][0] == 1
+        assert snapshot["legal_move"][0] > 0
+        assert snapshot["available_moves"][1] >= 0.0
+    finally:
+        reversi.disable_instrumentation()
+    assert not reversi.instrumentation_enabled()
+    assert Reversi.__dict__["apply_move"] is original
+
+    rev.apply_move((2, 2))
+    assert reversi.stats()["apply_move"][0] == 1
+    reversi.reset_stats()
+    assert all(calls == 0 for calls, _ in reversi.stats().values())
+
+def test_move_delta_listener():
+    """
+    Tests that apply_move publishes the placed and flipped squares, the new
+    turn and the game over flag to registered listeners
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    deltas = []
+    rev.add_listener(deltas.append)
+    rev.apply_move((3, 2))
+
+    assert len(deltas) == 1
+    delta = deltas[0]
+    assert delta.position == (3, 2)
+    assert delta.player == 1
+    assert delta.flipped == [(3, 3)]
+    assert delta.old_owners == [2]
+    assert delta.turn == 2
+    assert delta.skipped == []
+    assert not delta.game_over
+
+    rev.remove_listener(deltas.append)
+    rev.apply_move((2, 2))
+    assert len(deltas) == 1
+
+def test_move_delta_game_over():
+    """
+    Tests that the final move of a game is published with game_over set
+    """
+    rev = Reversi(side=7, players=3, othello=False)
+    new_grid = [[1, 1, 1, 1, 1, 1, 1], [1, 1, 1, 1, 1, 1, 1],
+                [1, 1, 1, 1, 1, 1, 1], [1, 1, 1, 1, 1, 1, 1],
+                [1, None, 2, 3, 3, 2, 1], [2, 2, 2, 2, 2, 2, 2],
+                [3, 3, 3, 3, 3, 3, 3]]
+    rev.load_game(1, new_grid)
+    deltas = []
+    rev.add_listener(deltas.append)
+    rev.apply_move((4, 1))
+
+    assert deltas[0].game_over
+    assert sorted(deltas[0].flipped) == [(4, 2), (4, 3), (4, 4), (4, 5)]
+    assert deltas[0].old_owners.count(3) == 2
+
+@pytest.mark.parametrize("side, players, othello",
+                         [(8, 2, True), (6, 2, False), (7, 3, False)])
+def test_game_state_matches_reversi(side, players, othello):
+    """
+    Plays random games with Reversi and GameState side by side and checks
+    that both agree on every move, turn and final outcome
+    """
+    rng = random.Random(side * 10 + players)
+    rev = Reversi(side=side, players=players, othello=othello)
+    state = GameState.from_reversi(rev)
+    while not rev.done:
+        moves = rev.available_moves
+        assert reversi.legal_moves(state) == moves
+        move = rng.choice(moves)
+        rev.apply_move(move)
+        state = reversi.play(state, move)
+        assert state == GameState.from_reversi(rev)
+        assert state.counters == tuple(rev.player_counter[i]
+                                       for i in range(1, players + 1))
+    assert reversi.is_done(state)
+    assert reversi.winners(state) == rev.outcome
+
+def test_game_state_round_trip():
+    """
+    Tests that a GameState is hashable and survives a round trip through
+    a Reversi game, and that play does not modify the original state
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    rev.apply_move((3, 2))
+    state = GameState.from_reversi(rev)
+    assert hash(state) == hash(GameState.from_reversi(rev))
+
+    copy = state.to_reversi()
+    assert copy.grid == rev.grid
+    assert copy.turn == rev.turn
+    assert copy.available_moves == rev.available_moves
+    assert GameState.from_reversi(copy) == state
+
+    after = reversi.play(state, (2, 2))
+    assert after != state
+    assert state.board[2 * 8 + 2] == 0
+    with pytest.raises(ValueError):
+        reversi.play(state, (0, 0))
+    with pytest.raises(ValueError):
+        reversi.play(state, (8, 0))
+
+def test_pickle_round_trip():
+    """
+    Tests that a pickled game only carries the packed position and that
+    it keeps playing identically after unpickling
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    for move in [(3, 2), (2, 2), (2, 3)]:
+        rev.apply_move(move)
+    data = pickle.dumps(rev)
+    assert b"Piece" not in data
+
+    copy = pickle.loads(data)
+    assert copy.grid == rev.grid
+    assert copy.turn == rev.turn
+    assert copy.player_counter == rev.player_counter
+    assert copy.available_moves == rev.available_moves
+    move = rev.available_moves[0]
+    copy.apply_move(move)
+    rev.apply_move(move)
+    assert copy.grid == rev.grid
+    assert sorted(copy.outcome) == sorted(rev.outcome)
+
+def brute_force_stable(rev: Reversi) -> dict:
+    """
+    Recomputes the stable discs of a game from scratch
+    """
+    stable = {i: set() for i in range(1, rev.num_players + 1)}
+    occupied = [(r, c) for r in range(rev.size) for c in range(rev.size)
+                if rev.grid[r][c] is not None]
+    reversi.grow_stable(rev.grid, stable, occupied)
+    return stable
+
+def test_stable_discs_incremental():
+    """
+    Tests that the stable discs updated after each move match a full
+    recomputation, and that stable discs are never flipped
+    """
+    rng = random.Random(7)
+    for side, players, othello in [(6, 2, True), (7, 3, False)]:
+        rev = Reversi(side=side, players=players, othello=othello)
+        assert rev.stable_discs == {i: set() for i in range(1, players + 1)}
+        seen = {}
+        while not rev.done:
+            rev.apply_move(rng.choice(rev.available_moves))
+            assert rev.stable_discs == brute_force_stable(rev)
+            for player, discs in rev.stable_discs.items():
+                for pos in discs:
+                    assert rev.piece_at(pos) == player
+                    assert seen.setdefault(pos, player) == player
+
+def test_stable_discs_corner():
+    """
+    Tests that a corner, and the edge pieces anchored to it, are stable
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    grid = [[None] * 8 for _ in range(8)]
+    grid[0][0] = grid[0][1] = grid[0][2] = 1
+    grid[0][3] = 2
+    grid[3][3] = grid[4][4] = 2
+    grid[3][4] = grid[4][3] = 1
+    rev.load_game(1, grid)
+    assert rev.stable_discs[1] == {(0, 0), (0, 1), (0, 2)}
+    assert rev.stable_discs[2] == set()
+
+class ScriptedRandom(random.Random):
+    """
+    Random number generator that records the choices it makes
+    """
+
+    def __init__(self, seed):
+        super().__init__(seed)
+        self.choices = []
+
+    def randrange(self, n):
+        choice = super().randrange(n)
+        self.choices.append(choice)
+        return choice
+
+@pytest.mark.parametrize("side,players,othello", [(8, 2, True), (8, 2, False),
+                                                  (7, 3, False), (6, 4, False)])
+def test_random_playout_matches_apply_move(side, players, othello):
+    """
+    Tests that random_playout plays the same games as apply_move would,
+    and leaves the game unchanged
+    """
+    for seed in range(5):
+        rev = Reversi(side=side, players=players, othello=othello)
+        rev.apply_move(sorted(rev.available_moves)[0])
+        before = GameState.from_reversi(rev)
+        rng = ScriptedRandom(seed)
+        counters, winners = reversi.random_playout(rev, rng)
+        assert GameState.from_reversi(rev) == before
+        for choice in rng.choices:
+            rev.apply_move(sorted(rev.available_moves)[choice])
+        assert rev.done
+        assert counters == [rev.player_counter[p]
+                            for p in range(1, players + 1)]
+        assert winners == rev.outcome
+
+def test_move_flips():
+    """
+    Tests that move_flips gives every legal move with the number of
+    pieces it flips
+    """
+    rng = random.Random(3)
+    for side, players, othello in [(8, 2, True), (7, 3, False)]:
+        rev = Reversi(side=side, players=players, othello=othello)
+        while not rev.done:
+            counts = rev.move_flips()
+            assert list(counts) == rev.available_moves
+            player = rev.turn
+            mine = sum(row.count(player) for row in rev.grid)
+            for move, flips in counts.items():
+                after = pickle.loads(pickle.dumps(rev))
+                after.apply_move(move)
+                assert sum(row.count(player)
+                           for row in after.grid) == mine + flips + 1
+            rev.apply_move(rng.choice(rev.available_moves))
+
+def test_simulate_many_matches_simulate_moves():
+    """
+    Tests that simulate_many reaches the same positions as separate
+    calls to simulate_moves, skipping illegal moves, and leaves the game
+    unchanged
+    """
+    rng = random.Random(5)
+    rev = Reversi(side=8, players=2, othello=True)
+    for _ in range(6):
+        rev.apply_move(rng.choice(rev.available_moves))
+    before = GameState.from_reversi(rev)
+    sequences = [[]]
+    for _ in range(30):
+        prefix = list(rng.choice(sequences))
+        game = rev.simulate_moves(prefix)
+        if game.available_moves and rng.random() < 0.8:
+            prefix.append(rng.choice(game.available_moves))
+        else:
+            prefix.append((rng.randrange(8), rng.randrange(8)))
+        sequences.append(prefix)
+    sequences.append(list(sequences[-1]))
+    games = rev.simulate_many(sequences)
+    assert GameState.from_reversi(rev) == before
+    for moves, game in zip(sequences, games):
+        expected = rev.simulate_moves(moves)
+        assert game.grid == expected.grid
+        assert game.turn == expected.turn
+    assert games[-1] is not games[-2]
+    counts = rev.simulate_many(sequences, lambda g: g.player_counter[1])
+    assert counts == [sum(row.count(1) for row in g.grid) for g in games]
+    with pytest.raises(ValueError):
+        rev.simulate_many([[(0, 0)], [(8, 0)]])
+
+@pytest.mark.parametrize("side, players, othello",
+                         [(8, 2, True), (8, 2, False), (7, 3, False)])
+def test_move_cache_matches_board_scan(side, players, othello):
+    """
+    Tests that, with the move cache enabled, games go exactly as without
+    it, that repeated queries hit the cache, and that the cache stays
+    within its size
+    """
+    def play_out(seed):
+        rng = random.Random(seed)
+        rev = Reversi(side=side, players=players, othello=othello)
+        history = []
+        while not rev.done:
+            moves = rev.available_moves
+            history.append((rev.turn, moves, rev.move_flips()))
+            rev.apply_move(rng.choice(moves))
+        return history, rev.outcome
+
+    expected = play_out(3)
+    cache = reversi.enable_move_cache(maxsize=16)
+    try:
+        assert play_out(3) == expected
+        hits, misses, size = reversi.move_cache_stats()
+        assert hits > 0 and misses > 0
+        assert size == len(cache) <= 16
+        assert play_out(3) == expected
+        assert reversi.move_cache_stats()[0] > hits
+        cache.clear()
+        assert reversi.move_cache_stats() == (0, 0, 0)
+    finally:
+        reversi.disable_move_cache()
+    assert reversi.move_cache_stats() == (0, 0, 0)
+    with pytest.raises(ValueError):
+        reversi.MoveCache(0)
@@ -0,0 +1,258 @@
+"""
+Tests for the game tree search
+"""
+import random
+import struct
+import threading
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+
+import search
+from reversi import Reversi, GameState, legal_moves, play
+from search import (Searcher, SearchResult, ParallelSearcher, disc_difference,
+                    final_score, WIN_SCORE)
+
+
+def brute_force(state: GameState, depth: int) -> float:
+    """
+    Plain negamax without pruning, for two players
+    """
+    moves = legal_moves(state)
+    if not moves or depth == 0:
+        if not moves:
+            diff = disc_difference(state, state.turn)
+            if diff == 0:
+                return 0.0
+            return (WIN_SCORE if diff > 0 else -WIN_SCORE) + diff
+        return disc_difference(state, state.turn)
+    best = -float("inf")
+    for move in moves:
+        child = play(state, move)
+        score = brute_force(child, depth - 1)
+        best = max(best, score if child.turn == state.turn else -score)
+    return best
+
+
+def test_search_matches_brute_force():
+    """
+    Tests that alpha-beta finds the same score as a plain minimax
+    """
+    rev = Reversi(side=6, players=2, othello=True)
+    state = GameState.from_reversi(rev)
+    for depth in (1, 2, 3):
+        result = Searcher(max_depth=depth).search(state)
+        assert isinstance(result, SearchResult)
+        assert result.depth == depth
+        assert result.score == brute_force(state, depth)
+        assert result.move in rev.available_moves
+        assert result.pv[0] == result.move
+
+
+def test_search_does_not_modify_game():
+    """
+    Tests that searching a Reversi game leaves it untouched
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    grid = [row[:] for row in rev.grid]
+    Searcher(max_depth=3).search(rev)
+    assert rev.grid == grid
+    assert rev.turn == 1
+
+
+def test_search_finds_winning_move():
+    """
+    Tests that the search takes the move that ends the game with a win
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    grid = [[1, 2, 1, 1, 1, 1, 2, None], [2, 2, 1, 1, 1, 1, 2, 1],
+            [1, 2, 1, 1, 1, 1, 2, 1], [1, 2, 2, 1, 1, 2, 2, 1],
+            [2, 2, 2, 2, 2, 2, 2, 2], [2, 2, 2, 2, 2, 2, 2, 2],
+            [2, 2, 2, 2, 2, 2, 2, 2], [2, None, 2, 2, 2, 2, None, 2]]
+    rev.load_game(2, grid)
+    result = Searcher(max_depth=5).search(rev)
+    assert result.move == (0, 7)
+    assert result.score >= WIN_SCORE
+
+
+def test_draw_scores_zero():
+    """
+    Tests that a drawn game scores 0 for both players, and that a search
+    of a position whose best outcome is a draw neither reports it as a
+    win nor stops deepening as if it had proved one
+    """
+    drawn = None
+    for seed in range(100):
+        rng = random.Random(seed)
+        history = [GameState.from_reversi(Reversi(side=4, players=2,
+                                                  othello=True))]
+        while legal_moves(history[-1]):
+            history.append(play(history[-1],
+                                rng.choice(legal_moves(history[-1]))))
+        final = history[-1]
+        if final.counters[0] == final.counters[1]:
+            assert final_score(final, 1) == final_score(final, 2) == 0.0
+            assert Searcher().search(final).score == 0.0
+        drawn = next((state for state in reversed(history[:-1])
+                      if state.empties <= 8
+                      and len(legal_moves(state)) > 1
+                      and brute_force(state, 16) == 0.0), None)
+        if drawn is not None:
+            break
+    assert drawn is not None
+    result = Searcher(max_depth=16).search(drawn)
+    assert result.score == 0.0
+    assert result.depth == 16
+
+
+@pytest.mark.parametrize("node_limit", [1, 50, 500])
+def test_search_node_budget(node_limit):
+    """
+    Tests that the search stops at its node budget and still returns a
+    legal move
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    result = Searcher(node_limit=node_limit).search(rev)
+    assert result.move in rev.available_moves
+    assert result.nodes <= node_limit + 1
+
+
+def test_search_stop_event():
+    """
+    Tests that a search stops soon after its stop event is set, and
+    still returns a legal move
+    """
+    rev = Reversi(side=8, players=2, othello=True)
+    stop = threading.Event()
+    stop.set()
+    searcher = Searcher(max_depth=30)
+    result = searcher.search(rev, stop)
+    assert result.move in rev.available_moves
+    assert result.nodes <= Searcher.CHECK_EVERY
+
+
+def test_search_more_players():
+    """
+    Tests the max^n search on a three-player game
+    """
+    rev = Reversi(side=7, players=3, othello=False)
+    state = GameState.from_reversi(rev)
+    for _ in range(9):
+        state = play(state, legal_moves(state)[0])
+    result = Searcher(max_depth=2).search(state)
+    assert result.move in legal_moves(state)
+    assert result.depth == 2
+
+
+def test_parallel_search_matches_serial():
+    """
+    Tests that splitting the root moves across processes gives the same
+    score as the serial search
+    """
+    rev = Reversi(side=6, players=2, othello=True)
+    state = play(GameState.from_reversi(rev), (1, 2))
+    parallel = ParallelSearcher(workers=2, max_depth=3)
+    try:
+        result = parallel.search(state)
+    finally:
+        parallel.close()
+    serial = Searcher(max_depth=3).search(state)
+    assert result.depth == 3
+    assert result.score == serial.score
+    assert result.move in legal_moves(state)
+
+
+def test_parallel_search_deadline():
+    """
+    Tests that root moves waiting for a worker share the deadline of the
+    search instead of starting their own
+    """
+    rng = random.Random(4)
+    state = GameState.from_reversi(Reversi(side=8, players=2, othello=True))
+    while len(legal_moves(state)) < 10:
+        state = play(state, rng.choice(legal_moves(state)))
+    parallel = ParallelSearcher(workers=2, max_depth=30, time_limit=0.3)
+    try:
+        start = time.perf_counter()
+        result = parallel.search(state)
+        elapsed = time.perf_counter() - start
+    finally:
+        parallel.close()
+    assert result.move in legal_moves(state)
+    assert elapsed < 0.6
+
+
+def test_root_move_narrows_window(monkeypatch):
+    """
+    Tests that a worker searching a root move notices when a sibling
+    raises the shared alpha bound, and searches again with the narrower
+    window
+    """
+    state = GameState.from_reversi(Reversi(side=6, players=2, othello=True))
+    move = legal_moves(state)[0]
+    child = play(state, move)
+    expected = brute_force(child, 4)
+    if child.turn != state.turn:
+        expected = -expected
+
+    raised = []
+
+    class CountingWindowRaised(search.WindowRaised):
+        def __init__(self, *args):
+            raised.append(True)
+            super().__init__(*args)
+
+    alpha = SharedMemory(create=True, size=8)
+    try:
+        monkeypatch.setattr(search, "WindowRaised", CountingWindowRaised)
+        monkeypatch.setattr(search, "_worker_searcher", None)
+        monkeypatch.setattr(search, "_worker_alpha", None)
+        monkeypatch.setattr(search, "_worker_lock", None)
+        search._init_worker(alpha.name, threading.Lock())
+        struct.pack_into("d", alpha.buf, 0, -float("inf"))
+        calls = []
+
+        def evaluate(state, player):
+            calls.append(True)
+            if len(calls) == 5:
+                struct.pack_into("d", alpha.buf, 0, expected - 1)
+            return disc_difference(state, player)
+
+        result = search._search_root_move(state, move, 5, evaluate, None)
+        assert result[:2] == (move, expected)
+        assert raised
+        assert struct.unpack_from("d", alpha.buf)[0] == expected
+    finally:
+        search._worker_alpha.close()
+        alpha.close()
+        alpha.unlink()
+
+
+def test_root_move_bounds_remembered_moves(monkeypatch):
+    """
+    Tests that a worker forgets its remembered best moves once there are
+    more than MAX_REMEMBERED, like Searcher.search does
+    """
+    state = GameState.from_reversi(Reversi(side=6, players=2, othello=True))
+    stale = play(state, legal_moves(state)[1])
+    alpha = SharedMemory(create=True, size=8)
+    try:
+        monkeypatch.setattr(Searcher, "MAX_REMEMBERED", 10)
+        monkeypatch.setattr(search, "_worker_alpha", None)
+        monkeypatch.setattr(search, "_worker_lock", None)
+        searcher = Searcher(disc_difference)
+        searcher.best_moves[stale] = legal_moves(stale)[0]
+        for i in range(20):
+            searcher.best_moves[stale._replace(num_moves=100 + i)] = (0, 0)
+        monkeypatch.setattr(search, "_worker_searcher", searcher)
+        search._init_worker(alpha.name, threading.Lock())
+        struct.pack_into("d", alpha.buf, 0, -float("inf"))
+        search._search_root_move(state, legal_moves(state)[0], 3,
+                                 disc_difference, None)
+        assert stale not in searcher.best_moves
+        assert len(searcher.best_moves) <= 10
+    finally:
+        search._worker_alpha.close()
+        alpha.close()
+        alpha.unlink()
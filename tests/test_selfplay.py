@@ -0,0 +1,64 @@
+"""
+Tests for self-play datasets
+"""
+import os
+import random
+
+import pytest
+
+from reversi import Reversi, GameState
+from bot import RandomBot, SmartBot
+from tournament import play_game
+from selfplay import (run_selfplay, game_records, Shard, Dataset, HEADER,
+                      record_struct)
+
+
+def test_game_records_replay_game(tmp_path):
+    """
+    Tests that the records of a game hold its positions, moves and
+    winners
+    """
+    result = play_game([RandomBot, SmartBot], (0, 1, 0), 7, 3, False, seed=4)
+    path = tmp_path / "game.bin"
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(b"RVSP", 1, 7, 3))
+        f.write(game_records(7, 3, False, result["moves"], result["winners"]))
+    shard = Shard(str(path))
+    assert len(shard) == len(result["moves"])
+    rev = Reversi(7, 3, False)
+    for i, move in enumerate(result["moves"]):
+        state = GameState.from_reversi(rev)
+        position = shard[i]
+        assert position.board == state.board
+        assert position.turn == state.turn
+        assert position.move == tuple(move)
+        assert position.winners == result["winners"]
+        rev.apply_move(tuple(move))
+    with pytest.raises(IndexError):
+        shard[len(shard)]
+    shard.close()
+
+
+def test_run_selfplay(tmp_path):
+    """
+    Tests that self-play writes every position of every game to the
+    shards, and that the dataset reads them back in shuffled batches
+    """
+    paths = run_selfplay([RandomBot], 7, str(tmp_path), side=6, workers=2,
+                         games_per_shard=3, seed=11)
+    assert [os.path.basename(p) for p in paths] == \
+        ["shard-00000.bin", "shard-00001.bin", "shard-00002.bin"]
+    record = record_struct(6)
+    sizes = [(os.path.getsize(p) - HEADER.size) // record.size for p in paths]
+    with Dataset(paths) as data:
+        assert len(data) == sum(sizes)
+        assert data[sizes[0]] == Shard(paths[1])[0]
+        seen = []
+        for batch in data.batches(50, random.Random(0)):
+            assert len(batch) <= 50
+            seen.extend(batch)
+        assert len(seen) == len(data)
+        assert sorted(seen) == sorted(data[i] for i in range(len(data)))
+        assert seen[:10] != [data[i] for i in range(10)]
+        starts = sum(1 for p in seen if p.board.count(0) == 32)
+        assert starts == 7
@@ -0,0 +1,127 @@
+"""
+Tests for the tournament runner
+"""
+import io
+import json
+
+import pytest
+
+from bot import RandomBot, SmartBot
+from tournament import (seatings, play_game, replay_game, Standings,
+                        run_tournament, SPRT, run_match)
+
+
+def test_seatings_every_bot_every_seat():
+    """
+    Tests that seatings rotate every bot through every seat
+    """
+    assert seatings(2, 2) == [(0, 1), (1, 0)]
+    assert seatings(2, 3) == [(0, 1, 0), (1, 0, 1)]
+    assert len(seatings(3, 2)) == 6
+
+
+def test_play_game():
+    """
+    Tests that a game between two bots runs to the end
+    """
+    result = play_game([RandomBot, SmartBot], (1, 0), 6, 2, True)
+    assert result["seating"] == [1, 0]
+    assert result["winners"]
+    assert sum(result["counters"]) <= 36
+
+
+def test_standings_shared_win_is_draw():
+    """
+    Tests that a shared win is counted as a draw for the winners
+    """
+    standings = Standings(["a", "b"])
+    standings.add({"seating": [0, 1], "winners": [1]})
+    standings.add({"seating": [1, 0], "winners": [1, 2]})
+    assert standings.wins == [1, 0]
+    assert standings.draws == [1, 1]
+    assert standings.losses == [0, 1]
+    rate, half = standings.score(0)
+    assert rate == 0.75
+    assert 0 < half < 1
+
+
+def test_run_tournament_streams_results():
+    """
+    Tests that a tournament writes one JSON line per game and
+    reports the standings every report_every games
+    """
+    out = io.StringIO()
+    log = io.StringIO()
+    standings = run_tournament([RandomBot, SmartBot], 10, side=6, workers=2,
+                               chunk_size=3, out=out, log=log,
+                               report_every=4)
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert sorted(line["game"] for line in lines) == list(range(10))
+    assert all(line["bots"][0] in ("RandomBot", "SmartBot") for line in lines)
+    assert standings.games == 10
+    assert sum(standings.wins) + sum(standings.losses) \
+        + sum(standings.draws) == 20
+    assert log.getvalue().count("after") == 3
+
+
+def test_run_tournament_needs_two_bots():
+    """
+    Tests that a tournament of one bot is rejected
+    """
+    with pytest.raises(ValueError):
+        run_tournament([RandomBot], 1)
+
+
+def test_seeded_tournament_is_reproducible():
+    """
+    Tests that the same master seed gives the same games, whatever the
+    number of workers and chunks
+    """
+    runs = []
+    for workers, chunk_size in ((1, 10), (3, 2)):
+        out = io.StringIO()
+        run_tournament([RandomBot, RandomBot], 6, side=6, workers=workers,
+                       chunk_size=chunk_size, out=out, log=None, seed=7)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        runs.append(sorted((line["game"], line["seed"], line["moves"])
+                           for line in lines))
+    assert runs[0] == runs[1]
+    assert len({str(moves) for _, _, moves in runs[0]}) > 1
+
+
+def test_replay_game():
+    """
+    Tests that a recorded game is replayed move for move
+    """
+    factories = [RandomBot, SmartBot]
+    result = play_game(factories, (0, 1), 6, 2, False, seed=12345)
+    replayed = replay_game(factories, json.loads(json.dumps(result)))
+    assert replayed["moves"] == result["moves"]
+    assert replayed["winners"] == result["winners"]
+
+
+def test_sprt_llr():
+    """
+    Tests that the log-likelihood ratio grows with the score of the
+    first bot and that the bounds decide the test
+    """
+    sprt = SPRT(0, 50, 0.05, 0.05)
+    assert sprt.llr(0, 0, 0) == 0.0
+    assert sprt.llr(60, 0, 40) > 0 > sprt.llr(50, 0, 50)
+    assert sprt.decide(10, 0, 10) is None
+    assert sprt.decide(600, 0, 400) == "H1"
+    assert sprt.decide(500, 0, 500) == "H0"
+    with pytest.raises(ValueError):
+        SPRT(10, 0)
+
+
+def test_run_match_stops_early():
+    """
+    Tests that a match between bots of very different strength stops
+    long before the game limit
+    """
+    result = run_match(SmartBot, RandomBot, SPRT(0, 200), max_games=1000,
+                       side=6, workers=2, chunk_size=2, log=None, seed=3)
+    assert result.decision == "H1"
+    assert result.llr >= SPRT(0, 200).upper
+    assert result.standings.games < 200